@@ -42,13 +42,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'big_brother.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'big_brother.middleware.SessionRevocationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'big_brother.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'LibertyEye.urls'
@@ -82,6 +85,35 @@ DATABASES = {
 }
 
 
+# Sessions and authentication (see big_brother.auth)
+# Signed cookie sessions and a cached user: authenticated requests need no database query
+SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+AUTHENTICATION_BACKENDS = ['big_brother.auth.CachedModelBackend']
+AUTH_CACHE_TIMEOUT = 30  # Seconds; also how long a revoked session may survive in other processes
+
+# Per-process cache; use a shared backend (e.g. Redis) so revocation is immediate across workers
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/5.2/topics/auth/passwords/
+# New passwords are hashed with the first entry. Hashes made by the others still
+# verify and are upgraded on the next login, as are outdated cost settings.
+# Measure the login cost of each with `python manage.py bench_login`.
+
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -128,9 +160,69 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Large uploads are hashed while they stream to disk (see big_brother.storage)
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'big_brother.storage.HashingFileUploadHandler',
+]
+# Point FILE_UPLOAD_TEMP_DIR at an existing directory on the MEDIA_ROOT filesystem
+# so stored uploads are renamed into place instead of copied
+
 # Static files
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+# collectstatic writes content-hashed names plus .gz/.br variants, served by big_brother.views.serve_static
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'big_brother.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
 
 # Login URL
 LOGIN_URL = '/login/'
+
+# Sampling profiler (see big_brother.middleware.ProfilingMiddleware)
+# Fraction of requests to profile; admins, moderators and staff can also send an X-Profile header
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0'))
+PROFILING_INTERVAL = 0.005  # Seconds between stack samples
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+
+# Prometheus metrics served at /metrics/ (see big_brother.metrics)
+# With several worker processes, set METRICS_DIR (e.g. to BASE_DIR / 'metrics'): every
+# worker dumps its samples there so the endpoint can sum them. Unset, each process
+# reports only its own samples.
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = 1.0  # Seconds between per-process dumps
+# Who may scrape /metrics/: these client addresses, or a request carrying
+# "Authorization: Bearer <METRICS_TOKEN>". Scrape workers directly, not through a
+# public load balancer, or its address would let everyone in.
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# participant_list facet and result caches (see big_brother.search). Entries are keyed by
+# a write counter kept in the database, so a write from any process, run_jobs included,
+# invalidates them everywhere; the timeouts only bound how long unused entries are kept.
+FACETS_CACHE_TIMEOUT = 60  # Seconds the unfiltered facet counts are cached
+SEARCH_CACHE_TIMEOUT = 300  # Seconds
+SEARCH_CACHE_MAX_IDS = 10000  # Larger result sets are paginated in the database instead
+
+# Background jobs, run by python manage.py run_jobs (see big_brother.jobs)
+# Jobs run inside the request that queues them until workers are deployed: start one or
+# more `python manage.py run_jobs` processes next to the web server, then set this to False.
+JOBS_RUN_INLINE = os.environ.get('JOBS_RUN_INLINE', 'true').lower() != 'false'
+JOB_LOCK_TIMEOUT = 300  # Seconds before a running job whose worker went silent is reclaimed
+JOB_RETRY_BACKOFF = 10  # Seconds before the first retry; doubles with each attempt
+# Workers queue warm_facets after writes and gc_avatars periodically; without workers,
+# run `python manage.py gc_avatars` from cron instead
+JOB_SCHEDULE_INTERVAL = 30  # Seconds between a worker's checks for due periodic jobs
+GC_AVATARS_INTERVAL = 24 * 3600  # Seconds
+JOB_RETENTION = 7 * 24 * 3600  # Seconds finished jobs are kept
+
+# participant_list bulk actions (see big_brother.bulk)
+BULK_ACTION_CHUNK_SIZE = 500  # Rows per UPDATE/transaction
+BULK_ACTION_INLINE_LIMIT = 1000  # Larger selections and "all matching" run as a background job
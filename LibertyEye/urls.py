@@ -1,12 +1,20 @@
+import os
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from big_brother.views import immutable_media, serve_static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('big_brother.urls')),
+    # Collected, fingerprinted assets; runserver serves the source files itself in DEBUG
+    re_path(r'^%s(?P<path>.*)$' % settings.STATIC_URL.lstrip('/'), serve_static),
 ]
 
 if settings.DEBUG:
+    urlpatterns += [
+        re_path(r'^%savatars/(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), immutable_media,
+                {'document_root': os.path.join(settings.MEDIA_ROOT, 'avatars')}),
+    ]
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
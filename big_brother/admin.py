@@ -1,5 +1,49 @@
 from django.contrib import admin
-from .models import Participant, Phone, Email, HistoricalRecord
+from django.contrib.admin.views.main import PAGE_VAR
+from django.core.paginator import Paginator
+from django.forms.models import BaseInlineFormSet
+from django.utils.functional import cached_property
+from .models import Participant, Phone, Email, HistoricalRecord, Job
+
+
+class CappedCountPaginator(Paginator):
+    """
+    Paginator that counts at most count_cap rows past the requested page, so
+    large tables aren't fully scanned on every page. The cap moves with the
+    page being viewed, so deeper pages stay reachable.
+    """
+    count_cap = 10000
+
+    def __init__(self, *args, page=1, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_limit = max(page - 1, 0) * self.per_page + self.count_cap
+
+    @cached_property
+    def counted(self):
+        # COUNT over a LIMITed subquery: at most count_limit + 1 rows are read
+        return self.object_list.order_by()[:self.count_limit + 1].count()
+
+    @cached_property
+    def count(self):
+        return min(self.counted, self.count_limit)
+
+    @cached_property
+    def capped(self):
+        """Whether there are more rows than count says"""
+        return self.counted > self.count_limit
+
+
+class CappedCountAdmin(admin.ModelAdmin):
+    """ModelAdmin for large tables: no full result count, capped page counts"""
+    show_full_result_count = False
+    paginator = CappedCountPaginator
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        try:
+            page = int(request.GET.get(PAGE_VAR, 1))
+        except ValueError:
+            page = 1
+        return self.paginator(queryset, per_page, orphans, allow_empty_first_page, page=page)
 
 
 class PhoneInline(admin.TabularInline):
@@ -12,17 +56,36 @@ class EmailInline(admin.TabularInline):
     extra = 1
 
 
+class RecentHistoryFormSet(BaseInlineFormSet):
+    """Inline formset that only loads the most recent history records"""
+    max_shown = 20
+
+    def get_queryset(self):
+        if not hasattr(self, '_recent_queryset'):
+            queryset = super().get_queryset()
+            # Slice on ids so the formset can still filter the queryset afterwards
+            recent_ids = list(queryset.values_list('pk', flat=True)[:self.max_shown])
+            # Rows render the record's __str__, which reads the participant
+            self._recent_queryset = queryset.filter(pk__in=recent_ids).select_related('participant')
+        return self._recent_queryset
+
+
 class HistoricalRecordInline(admin.TabularInline):
     model = HistoricalRecord
+    formset = RecentHistoryFormSet
     extra = 0
     readonly_fields = ['changed_at']
+    verbose_name_plural = 'Recent historical records'
+    show_change_link = True
 
 
 @admin.register(Participant)
-class ParticipantAdmin(admin.ModelAdmin):
+class ParticipantAdmin(CappedCountAdmin):
     list_display = ['username', 'nickname', 'get_full_name', 'status', 'role']
     list_filter = ['status', 'role']
     search_fields = ['username', 'nickname', 'first_name', 'last_name']
+    list_select_related = ['assigned_by']
+    autocomplete_fields = ['assigned_by']
     inlines = [PhoneInline, EmailInline, HistoricalRecordInline]
     # exclude = ['password']  # Don't show password in admin
 
@@ -33,7 +96,17 @@ class ParticipantAdmin(admin.ModelAdmin):
 
 
 @admin.register(HistoricalRecord)
-class HistoricalRecordAdmin(admin.ModelAdmin):
+class HistoricalRecordAdmin(CappedCountAdmin):
     list_display = ['participant', 'record_type', 'changed_at']
     list_filter = ['record_type', 'changed_at']
     search_fields = ['participant__username', 'value']
+    list_select_related = ['participant']
+    autocomplete_fields = ['participant']
+
+
+@admin.register(Job)
+class JobAdmin(CappedCountAdmin):
+    list_display = ['kind', 'status', 'priority', 'attempts', 'run_after', 'locked_by', 'finished_at']
+    list_filter = ['status', 'kind']
+    search_fields = ['kind', 'dedupe_key']
+    readonly_fields = ['attempts', 'locked_by', 'locked_at', 'created_at', 'finished_at', 'last_error']
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class BigBrotherConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'big_brother'
+
+    def ready(self):
+        from . import metrics, search  # noqa: F401 (search connects its cache invalidation receivers)
+        metrics.instrument_templates()
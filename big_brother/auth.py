@@ -0,0 +1,116 @@
+"""
+Authentication fast path.
+
+Sessions live in signed cookies and the logged-in User is cached, so an
+authenticated request needs no database query. Every session, the admin's
+included, records its User's session generation at login; bumping it (on
+logout, or a participant's role or status change) revokes every session
+issued before it. Participant sessions also remember the role for role_check.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import metrics
+
+ROLE_SESSION_KEY = '_participant_role'
+GENERATION_SESSION_KEY = '_session_generation'
+
+
+def auth_cache_timeout():
+    return getattr(settings, 'AUTH_CACHE_TIMEOUT', 30)
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def generation_cache_key(user_id):
+    return f'auth:generation:{user_id}'
+
+
+def generation_name(user_id):
+    return f'session:{user_id}'
+
+
+def get_session_generation(user_id):
+    """Current session generation of a User; 0 until their sessions are first revoked"""
+    from .models import Generation
+
+    key = generation_cache_key(user_id)
+    generation = cache.get(key)
+    if generation is not None:
+        metrics.cache_hit('auth_generation')
+        return generation
+    metrics.cache_miss('auth_generation')
+    generation = Generation.objects.filter(name=generation_name(user_id)).values_list('value', flat=True).first() or 0
+    cache.set(key, generation, auth_cache_timeout())
+    return generation
+
+
+def bump_session_generations(user_ids):
+    """Revoke every session issued to these Users so far"""
+    from .models import Generation
+
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    names = [generation_name(user_id) for user_id in user_ids]
+    Generation.objects.filter(name__in=names).update(value=F('value') + 1)
+    # Users never revoked before have no row yet; sessions without one are at generation 0
+    Generation.objects.bulk_create([Generation(name=name, value=1) for name in names], ignore_conflicts=True)
+    cache.delete_many([generation_cache_key(user_id) for user_id in user_ids])
+
+
+def bump_session_generation(user_id):
+    bump_session_generations([user_id])
+
+
+def revoke_participant_sessions(usernames):
+    """Revoke the sessions of the Users participants log in as"""
+    users = get_user_model().objects.filter(username__in=list(usernames))
+    bump_session_generations(users.values_list('pk', flat=True))
+
+
+def start_participant_session(request, participant):
+    """Remember the role role_check needs for the rest of the session"""
+    request.session[ROLE_SESSION_KEY] = participant.role
+
+
+@receiver(user_logged_in)
+def record_session_generation(sender, request, user, **kwargs):
+    request.session[GENERATION_SESSION_KEY] = get_session_generation(user.pk)
+
+
+@receiver(user_logged_out)
+def revoke_sessions_on_logout(sender, request, user, **kwargs):
+    # Signed cookie sessions can't be deleted server side, so copies of this one are revoked instead
+    if user is not None:
+        bump_session_generation(user.pk)
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose per-request get_user is served from the cache"""
+
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is not None:
+            metrics.cache_hit('auth_user')
+            return user
+        metrics.cache_miss('auth_user')
+        user = super().get_user(user_id)
+        if user is not None:
+            cache.set(key, user, auth_cache_timeout())
+        return user
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def forget_cached_user(sender, instance, **kwargs):
+    cache.delete(user_cache_key(instance.pk))
@@ -31,6 +31,7 @@ class ParticipantForm(forms.ModelForm):
 
         # Make password not required for existing participants and clear the value
         if self.instance and self.instance.pk:
+            self.stored_password = self.instance.password
             self.fields['password'].required = False
             self.fields['confirm_password'].required = False
             # Clear the password field values for existing instances
@@ -59,6 +60,9 @@ class ParticipantForm(forms.ModelForm):
         # Only set password if it was provided
         if password:
             participant.set_password(password)
+        elif self.instance.pk:
+            # The empty field was copied onto the instance; keep the stored hash
+            participant.password = self.stored_password
 
         if commit:
             participant.save()
@@ -74,3 +78,57 @@ PhoneFormSet = inlineformset_factory(
 EmailFormSet = inlineformset_factory(
     Participant, Email, fields=('email',), extra=1, can_delete=True
 )
+
+
+class BulkActionForm(forms.Form):
+    ACTIONS = (
+        ('set_status', 'Set status'),
+        ('reassign', 'Reassign'),
+        ('set_role', 'Change role'),
+    )
+    SCOPES = (
+        ('selected', 'Selected participants'),
+        ('all', 'All matching participants'),
+    )
+
+    action = forms.ChoiceField(choices=ACTIONS)
+    scope = forms.ChoiceField(choices=SCOPES, initial='selected')
+    status = forms.ChoiceField(choices=Participant.USER_STATUS, required=False)
+    date_inactive = forms.DateField(required=False)
+    role = forms.ChoiceField(choices=Participant.ROLE_CHOICES, required=False)
+    assigned_by = forms.ModelChoiceField(queryset=Participant.objects.filter(role__in=['admin', 'moderator']),
+                                         required=False)
+    # The participant_list query string, to find "all matching participants"
+    query = forms.CharField(required=False, widget=forms.HiddenInput)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        action = cleaned_data.get('action')
+
+        if action == 'set_status' and not cleaned_data.get('status'):
+            raise ValidationError("Choose a status")
+        if action == 'set_role' and not cleaned_data.get('role'):
+            raise ValidationError("Choose a role")
+
+        try:
+            cleaned_data['ids'] = [int(pk) for pk in self.data.getlist('ids')]
+        except ValueError:
+            raise ValidationError("Invalid participant selection")
+        if cleaned_data.get('scope') == 'selected' and not cleaned_data['ids']:
+            raise ValidationError("Select at least one participant")
+
+        return cleaned_data
+
+    def changes(self):
+        """The field values the chosen action writes"""
+        action = self.cleaned_data['action']
+        if action == 'set_status':
+            date_inactive = self.cleaned_data.get('date_inactive')
+            return {
+                'status': self.cleaned_data['status'],
+                'date_inactive': date_inactive.isoformat() if date_inactive else None,
+            }
+        if action == 'reassign':
+            assigned_by = self.cleaned_data.get('assigned_by')
+            return {'assigned_by_id': assigned_by.pk if assigned_by else None}
+        return {'role': self.cleaned_data['role']}
@@ -0,0 +1,212 @@
+"""
+Database-backed background jobs.
+
+Jobs are rows in the Job table, so no broker is needed. Any number of
+`python manage.py run_jobs` workers can run at once: a worker claims a job
+with a conditional UPDATE that only one of them can win. Failed jobs are
+retried with exponential backoff, and jobs whose worker died are reclaimed
+once their lock is older than JOB_LOCK_TIMEOUT; long jobs call heartbeat()
+between steps to keep theirs fresh.
+
+Until a worker is deployed, JOBS_RUN_INLINE runs each job in the process
+that enqueues it, so no work waits on a worker that isn't there.
+
+Workers also queue the periodic maintenance jobs (schedule_periodic_jobs).
+"""
+import random
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job, Participant, HistoricalRecord
+
+HANDLERS = {}
+# The job this thread is running, for heartbeat()
+running = threading.local()
+
+
+class LockLost(Exception):
+    """The running job's lock expired and another worker reclaimed it"""
+
+
+def job(kind):
+    """Register a function as the handler for a job kind; it is called with the payload as kwargs"""
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+
+    return decorator
+
+
+def enqueue(kind, payload=None, priority=0, dedupe_key=None, run_after=None, max_attempts=5):
+    """Queue a job, or return the already queued job with the same dedupe_key"""
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    if dedupe_key:
+        existing = Job.objects.filter(dedupe_key=dedupe_key, status=Job.QUEUED).first()
+        if existing:
+            return existing
+
+    try:
+        with transaction.atomic():
+            queued = Job.objects.create(
+                kind=kind,
+                payload=payload or {},
+                priority=priority,
+                dedupe_key=dedupe_key,
+                run_after=run_after or timezone.now(),
+                max_attempts=max_attempts,
+            )
+    except IntegrityError:
+        # Another process queued the same key in between
+        return Job.objects.get(dedupe_key=dedupe_key, status=Job.QUEUED)
+
+    if getattr(settings, 'JOBS_RUN_INLINE', False):
+        # No worker deployed: claim and run it now, recording the outcome as a worker would.
+        # A failed job stays queued for retry and is picked up once a worker runs.
+        Job.objects.filter(pk=queued.pk).update(
+            status=Job.RUNNING, locked_by='inline', locked_at=timezone.now(), attempts=F('attempts') + 1
+        )
+        queued.refresh_from_db()
+        run_job(queued)
+        queued.refresh_from_db()
+    return queued
+
+
+def enqueue_once(kind, dedupe_key, **kwargs):
+    """Queue a job unless one with this dedupe_key was ever queued, whatever its status"""
+    if not Job.objects.filter(dedupe_key=dedupe_key).exists():
+        enqueue(kind, dedupe_key=dedupe_key, **kwargs)
+
+
+def schedule_periodic_jobs():
+    """Queue the maintenance jobs that are due and drop old finished ones; run_jobs calls this"""
+    from .search import data_generation
+
+    # Warm the facet counts once per data generation, i.e. after each burst of writes
+    enqueue_once('warm_facets', f'warm_facets:{data_generation()}', priority=-5)
+    # Collect unreferenced avatars once per GC_AVATARS_INTERVAL
+    interval = getattr(settings, 'GC_AVATARS_INTERVAL', 24 * 3600)
+    enqueue_once('gc_avatars', f'gc_avatars:{int(time.time() // interval)}', priority=-10)
+
+    retention = timedelta(seconds=getattr(settings, 'JOB_RETENTION', 7 * 24 * 3600))
+    Job.objects.filter(status=Job.DONE, finished_at__lt=timezone.now() - retention).delete()
+
+
+def claimable():
+    now = timezone.now()
+    lock_expired = now - timedelta(seconds=getattr(settings, 'JOB_LOCK_TIMEOUT', 300))
+    return Q(status=Job.QUEUED, run_after__lte=now) | Q(status=Job.RUNNING, locked_at__lt=lock_expired)
+
+
+def claim_job(worker):
+    """Claim the most urgent runnable job for this worker, or return None"""
+    candidates = Job.objects.filter(claimable()).order_by('-priority', 'run_after', 'id')
+    for pk in candidates.values_list('pk', flat=True)[:10]:
+        # Only one worker's UPDATE can match while the job is still claimable
+        claimed = Job.objects.filter(claimable(), pk=pk).update(
+            status=Job.RUNNING, locked_by=worker, locked_at=timezone.now(), attempts=F('attempts') + 1
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter, capped at an hour"""
+    delay = min(getattr(settings, 'JOB_RETRY_BACKOFF', 10) * 2 ** (attempts - 1), 3600)
+    return timedelta(seconds=delay * random.uniform(1, 1.25))
+
+
+def heartbeat():
+    """Refresh the running job's lock so it isn't reclaimed; raises LockLost if it already was"""
+    job = getattr(running, 'job', None)
+    if job is None:
+        return  # Called outside a job, e.g. an inline bulk action
+    refreshed = Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by).update(
+        locked_at=timezone.now()
+    )
+    if not refreshed:
+        raise LockLost(f"{job.kind} #{job.pk} was reclaimed by another worker")
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome; returns the job's new status"""
+    # Ignore the outcome if the lock expired and another worker reclaimed the job
+    owned = Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by)
+    # An inline job may be enqueued from inside another job
+    outer_job, running.job = getattr(running, 'job', None), job
+    try:
+        HANDLERS[job.kind](**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            try:
+                owned.update(status=Job.QUEUED, run_after=timezone.now() + retry_delay(job.attempts),
+                             last_error=error, locked_by='', locked_at=None)
+                return Job.QUEUED
+            except IntegrityError:
+                # An identical job was queued meanwhile and will do the work
+                error += '\nNot retried: superseded by an identical queued job'
+        owned.update(status=Job.FAILED, finished_at=timezone.now(), last_error=error, locked_by='', locked_at=None)
+        return Job.FAILED
+    finally:
+        running.job = outer_job
+
+    owned.update(status=Job.DONE, finished_at=timezone.now(), locked_by='', locked_at=None)
+    return Job.DONE
+
+
+# Built-in jobs
+
+@job('record_history')
+def record_history(participant_id, values):
+    """Add a historical record for every submitted value that differs from the current one"""
+    from .search import bump_data_generation
+
+    if not Participant.objects.filter(pk=participant_id).exists():
+        return
+
+    records = []
+    for record_type, value in values.items():
+        if value:  # Only create record if value is provided and different from current
+            current_value = HistoricalRecord.objects.filter(
+                participant_id=participant_id, record_type=record_type
+            ).values_list('value', flat=True).first()
+            if current_value != value:
+                records.append(HistoricalRecord(participant_id=participant_id, record_type=record_type, value=value))
+
+    if records:
+        HistoricalRecord.objects.bulk_create(records)
+        # bulk_create sends no post_save signals
+        bump_data_generation()
+
+
+@job('warm_facets')
+def warm_facets():
+    """Precompute the unfiltered participant_list facet counts"""
+    from .search import facet_rows
+
+    facet_rows({})
+
+
+@job('gc_avatars')
+def gc_avatars(min_age=24):
+    """Delete avatar blobs no participant references any more"""
+    call_command('gc_avatars', min_age=min_age)
+
+
+@job('bulk_update')
+def bulk_update_job(changes, actor, ids=None, query=''):
+    """Apply a participant_list bulk action to a large selection"""
+    from .bulk import bulk_update, target_participants
+
+    bulk_update(target_participants(ids, query), changes, actor)
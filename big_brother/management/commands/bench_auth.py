@@ -0,0 +1,67 @@
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from big_brother.middleware import QueryTimer
+from big_brother.models import Participant
+
+CONFIGURATIONS = [
+    ('before: database sessions, uncached user', {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'AUTHENTICATION_BACKENDS': ['django.contrib.auth.backends.ModelBackend'],
+    }),
+    ('after: signed cookie sessions, cached user', {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.signed_cookies',
+        'AUTHENTICATION_BACKENDS': ['big_brother.auth.CachedModelBackend'],
+    }),
+]
+
+
+class Command(BaseCommand):
+    help = 'Measure per-request session and authentication overhead before and after the fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests to time per configuration')
+
+    def handle(self, *args, **options):
+        # Everything created here is rolled back at the end
+        with transaction.atomic():
+            participant = Participant.objects.create(
+                username='bench-auth', password='bench-password', nickname='Bench', role='admin'
+            )
+            urls = [reverse('users:dashboard'), reverse('users:participant_detail', args=[participant.pk])]
+            for label, overrides in CONFIGURATIONS:
+                with override_settings(ALLOWED_HOSTS=['testserver'], DEBUG=False, **overrides):
+                    self.stdout.write(self.style.MIGRATE_HEADING(label))
+                    for url in urls:
+                        self.bench(url, options['requests'])
+            transaction.set_rollback(True)
+
+    def bench(self, url, requests):
+        cache.clear()
+        client = Client()
+        client.post(reverse('users:login'), {'username': 'bench-auth', 'password': 'bench-password'})
+        client.get(url)  # Warm up caches
+
+        durations, queries = [], []
+        for _ in range(requests):
+            query_timer = QueryTimer()
+            with connection.execute_wrapper(query_timer):
+                start = time.perf_counter()
+                response = client.get(url)
+                durations.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise CommandError(f'{url} returned {response.status_code}')
+            queries.append(query_timer.count)
+
+        durations.sort()
+        self.stdout.write(
+            f'  {url}: {statistics.mean(queries):.1f} queries/request, '
+            f'mean {statistics.mean(durations) * 1000:.2f} ms, '
+            f'p95 {durations[int(len(durations) * 0.95)] * 1000:.2f} ms'
+        )
@@ -0,0 +1,76 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, identify_hasher, make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from big_brother.models import Participant
+
+
+class Command(BaseCommand):
+    help = 'Measure login latency and throughput for each password hasher, to tune the hashing cost'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=20, help='Logins to time per hasher')
+        parser.add_argument('--hasher', action='append', dest='hashers', metavar='DOTTED.PATH',
+                            help='Hasher class to measure, repeatable; defaults to every one in PASSWORD_HASHERS')
+
+    def handle(self, *args, **options):
+        hashers = options['hashers'] or settings.PASSWORD_HASHERS
+        # Everything created here is rolled back at the end
+        with transaction.atomic():
+            for hasher_path in hashers:
+                with override_settings(PASSWORD_HASHERS=[hasher_path], ALLOWED_HOSTS=['testserver'], DEBUG=False):
+                    try:
+                        hasher = get_hasher()
+                        make_password('bench-password')  # Fails if the hasher's library is not installed
+                    except ValueError as e:
+                        self.stdout.write(self.style.WARNING(f'{hasher_path}: skipped ({e})'))
+                        continue
+                    self.stdout.write(self.style.MIGRATE_HEADING(hasher_path))
+                    self.bench(hasher, options['logins'])
+            transaction.set_rollback(True)
+
+    def bench(self, hasher, logins):
+        cache.clear()
+        participant, _ = Participant.objects.update_or_create(
+            username='bench-login', defaults={'nickname': 'Bench', 'role': 'admin', 'password': 'bench-password'}
+        )
+        participant.set_password('bench-password')
+        participant.save(update_fields=['password'])
+        client = Client()
+        self.login(client)  # Warm up; creates the Django user
+
+        durations = []
+        cpu_start = time.process_time()
+        for _ in range(logins):
+            client.cookies.clear()  # Sessions live in the cookie, so this logs out
+            start = time.perf_counter()
+            self.login(client)
+            durations.append(time.perf_counter() - start)
+        cpu_seconds = time.process_time() - cpu_start
+
+        participant.refresh_from_db()
+        if identify_hasher(participant.password).algorithm != hasher.algorithm:
+            raise CommandError(f'Password was not stored with {hasher.algorithm}')
+
+        # The cost parameters, without the masked salt and hash
+        cost = ', '.join(f'{name}={value}' for name, value in hasher.safe_summary(participant.password).items()
+                         if name not in ('salt', 'hash'))
+        durations.sort()
+        self.stdout.write(
+            f'  {cost}\n'
+            f'  mean {statistics.mean(durations) * 1000:.1f} ms, '
+            f'p95 {durations[int(len(durations) * 0.95)] * 1000:.1f} ms, '
+            f'{logins / cpu_seconds:.1f} logins/sec per core'
+        )
+
+    def login(self, client):
+        response = client.post(reverse('users:login'), {'username': 'bench-login', 'password': 'bench-password'})
+        if response.status_code != 302:
+            raise CommandError(f'Login failed with status {response.status_code}')
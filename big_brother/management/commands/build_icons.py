@@ -0,0 +1,74 @@
+import os
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+
+from big_brother.templatetags.custom_filters import RECORD_ICONS
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SOURCE_DIR = os.path.join(APP_DIR, 'assets', 'fontawesome')
+OUTPUT_DIR = os.path.join(APP_DIR, 'static', 'vendor', 'fontawesome')
+SCAN_DIRS = [os.path.join(APP_DIR, 'templates'), os.path.join(APP_DIR, 'static', 'js')]
+
+ICON_NAME = re.compile(r'\bfa-[a-z0-9-]+')
+ICON_RULE = re.compile(r'^\.(fa-[a-z0-9-]+)::before \{\n  content: "\\([0-9a-f]+)"; \}\n\n', re.MULTILINE)
+
+
+class Command(BaseCommand):
+    help = 'Subset Font Awesome to the icons used by the templates and the record_icon filter'
+
+    def handle(self, *args, **options):
+        try:
+            from fontTools import subset
+        except ImportError:
+            raise CommandError('build_icons needs fonttools and brotli: pip install fonttools brotli')
+
+        used = self.used_icon_names()
+
+        with open(os.path.join(SOURCE_DIR, 'fontawesome.css')) as source:
+            core_css = source.read()
+        kept = set()
+        codepoints = set()
+
+        def keep_used(match):
+            if match.group(1) not in used:
+                return ''
+            kept.add(match.group(1))
+            codepoints.add(int(match.group(2), 16))
+            return match.group(0)
+
+        core_css = ICON_RULE.sub(keep_used, core_css)
+
+        with open(os.path.join(SOURCE_DIR, 'solid.css')) as source:
+            # Only ship the subset woff2; every supported browser reads it
+            solid_css = source.read().replace(
+                ', url("../webfonts/fa-solid-900.ttf") format("truetype")', ''
+            )
+
+        os.makedirs(os.path.join(OUTPUT_DIR, 'css'), exist_ok=True)
+        os.makedirs(os.path.join(OUTPUT_DIR, 'webfonts'), exist_ok=True)
+        with open(os.path.join(OUTPUT_DIR, 'css', 'icons.css'), 'w') as output:
+            output.write(core_css + '\n' + solid_css)
+
+        subset_options = subset.Options()
+        subset_options.flavor = 'woff2'
+        font = subset.load_font(os.path.join(SOURCE_DIR, 'fa-solid-900.woff2'), subset_options)
+        subsetter = subset.Subsetter(subset_options)
+        subsetter.populate(unicodes=codepoints)
+        subsetter.subset(font)
+        subset.save_font(font, os.path.join(OUTPUT_DIR, 'webfonts', 'fa-solid-900.woff2'), subset_options)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {len(codepoints)} glyphs for: {", ".join(sorted(kept))}'
+        ))
+
+    def used_icon_names(self):
+        """Collect every fa-* class in the templates and scripts, plus the record_icon filter's set"""
+        used = set(RECORD_ICONS.values()) | {'fa-history'}
+        for directory in SCAN_DIRS:
+            for root, _, filenames in os.walk(directory):
+                for filename in filenames:
+                    if filename.endswith(('.html', '.js')):
+                        with open(os.path.join(root, filename)) as template:
+                            used.update(ICON_NAME.findall(template.read()))
+        return used
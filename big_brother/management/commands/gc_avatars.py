@@ -0,0 +1,51 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from big_brother.models import Participant
+
+
+class Command(BaseCommand):
+    help = 'Delete avatar blobs that no participant references any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=float, default=24,
+                            help='Only delete blobs older than this many hours, to spare in-flight saves')
+        parser.add_argument('--dry-run', action='store_true', help='List unreferenced blobs without deleting them')
+
+    def handle(self, *args, **options):
+        field = Participant._meta.get_field('avatar')
+        storage = field.storage
+        root = storage.path(field.upload_to)
+        if not os.path.isdir(root):
+            return
+
+        # Reference count per stored name, in a single grouped query
+        references = dict(
+            Participant.objects.exclude(avatar='').exclude(avatar__isnull=True)
+            .values_list('avatar').annotate(references=Count('id')).order_by()
+        )
+        shared = sum(1 for count in references.values() if count > 1)
+        cutoff = time.time() - options['min_age'] * 3600
+
+        deleted = freed = 0
+        for directory, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, storage.location).replace(os.sep, '/')
+                if name in references or os.path.getmtime(path) > cutoff:
+                    continue
+                size = os.path.getsize(path)
+                if options['dry_run']:
+                    self.stdout.write(f'Would delete {name} ({size} bytes)')
+                else:
+                    os.remove(path)
+                deleted += 1
+                freed += size
+
+        action = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(references)} referenced blobs ({shared} shared). {action} {deleted} blobs, {freed} bytes.'
+        ))
@@ -0,0 +1,56 @@
+import os
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from big_brother.profiling import read_profiles, hot_functions
+
+
+class Command(BaseCommand):
+    help = 'Merge sampled request profiles into collapsed stacks and hot function tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url_names', nargs='*',
+                            help='URL names to report on, e.g. participant_list (default: all)')
+        parser.add_argument('--top', type=int, default=20, help='Number of hot functions to list')
+        parser.add_argument('--collapsed', metavar='PATH',
+                            help='Write merged stacks in flamegraph.pl / speedscope collapsed format')
+
+    def handle(self, *args, **options):
+        directory = getattr(settings, 'PROFILING_DIR', settings.BASE_DIR / 'profiles')
+        if not os.path.isdir(directory):
+            raise CommandError(f'No profiles found in {directory}')
+
+        url_names = options['url_names'] or sorted(
+            name for name in os.listdir(directory) if os.path.isdir(os.path.join(directory, name))
+        )
+
+        merged = Counter()
+        for url_name in url_names:
+            if not os.path.isdir(os.path.join(directory, url_name)):
+                raise CommandError(f'No profiles recorded for {url_name}')
+            stacks = read_profiles(directory, url_name)
+            self.print_table(url_name, stacks, options['top'])
+            for stack, count in stacks.items():
+                # Prefix with the URL name so one flame graph can hold several views
+                merged[(url_name,) + stack] += count
+
+        if options['collapsed']:
+            with open(options['collapsed'], 'w') as output:
+                for stack, count in sorted(merged.items()):
+                    output.write(f"{';'.join(stack)} {count}\n")
+            self.stdout.write(self.style.SUCCESS(f"Collapsed stacks written to {options['collapsed']}"))
+
+    def print_table(self, url_name, stacks, top):
+        total = sum(stacks.values())
+        self_counts, total_counts = hot_functions(stacks)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'{url_name} ({total} samples)'))
+        self.stdout.write(f"{'self':>7} {'self%':>6} {'total':>7} {'total%':>6}  function")
+        for label, count in self_counts.most_common(top):
+            self.stdout.write(
+                f'{count:>7} {count / total:>6.1%} {total_counts[label]:>7} '
+                f'{total_counts[label] / total:>6.1%}  {label}'
+            )
+        self.stdout.write('')
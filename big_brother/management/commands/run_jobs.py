@@ -0,0 +1,43 @@
+import os
+import socket
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from big_brother.jobs import claim_job, run_job, schedule_periodic_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs; start several to run jobs concurrently'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once no job is runnable')
+        parser.add_argument('--sleep', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--worker', default=f'{socket.gethostname()}-{os.getpid()}',
+                            help='Name recorded on claimed jobs')
+        parser.add_argument('--no-schedule', action='store_true',
+                            help="Don't queue the periodic maintenance jobs from this worker")
+
+    def handle(self, *args, **options):
+        worker = options['worker']
+        self.stdout.write(f'Worker {worker} started')
+        schedule_interval = getattr(settings, 'JOB_SCHEDULE_INTERVAL', 30)
+        last_schedule = None
+        try:
+            while True:
+                if not options['no_schedule'] and (
+                        last_schedule is None or time.monotonic() - last_schedule >= schedule_interval):
+                    schedule_periodic_jobs()
+                    last_schedule = time.monotonic()
+                job = claim_job(worker)
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+                    continue
+                status = run_job(job)
+                self.stdout.write(f'{job.kind} #{job.pk} (attempt {job.attempts}): {status}')
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(f'Worker {worker} stopped')
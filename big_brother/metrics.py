@@ -0,0 +1,283 @@
+"""
+Prometheus text-format metrics.
+
+Each process keeps its samples in memory behind a single short-held lock.
+When METRICS_DIR is set, processes periodically dump their samples to a
+per-process JSON file there and the /metrics/ endpoint sums every file, so
+several WSGI workers report as one. Files of exited processes are folded
+into an archive file, so totals survive restarts without piling up files.
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1024, 16 * 1024, 128 * 1024, 512 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2, 64 * 1024 ** 2)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'http_requests_total': ('counter', 'Requests handled, by view and status code', None),
+    'http_request_duration_seconds': ('histogram', 'Request latency by view', LATENCY_BUCKETS),
+    'db_queries_total': ('counter', 'Database queries executed, by view', None),
+    'db_query_duration_seconds_total': ('counter', 'Time spent in database queries, by view', None),
+    'template_render_duration_seconds': ('histogram', 'Top-level template render time', LATENCY_BUCKETS),
+    'password_hash_duration_seconds': ('histogram', 'Password hash check time during login', LATENCY_BUCKETS),
+    'cache_requests_total': ('counter', 'Cache lookups, by cache and result (hit or miss)', None),
+    'upload_size_bytes': ('histogram', 'Size of uploaded files, by form field', SIZE_BUCKETS),
+    'password_rehash_total': ('counter', 'Stored password hashes upgraded to the preferred hasher at login', None),
+}
+
+ARCHIVE_FILENAME = 'metrics-archive.json'
+# metrics-<pid>-<process id>.json; the random part keeps a reused pid from overwriting a dead process's file
+SNAPSHOT_FILENAME = re.compile(r'^metrics-(\d+)(?:-[0-9a-f]+)?\.json$')
+
+
+class Registry:
+    """Per-process metric samples keyed by (name, sorted label pairs)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.last_flush = 0.0
+        self.pid = None
+        self.process_id = None
+
+    def snapshot_filename(self):
+        # A forked child gets its own file rather than sharing its parent's
+        if self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.process_id = uuid.uuid4().hex
+        return f'metrics-{self.pid}-{self.process_id}.json'
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        buckets = METRICS[name][2]
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                histogram = self.histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            histogram[0][bisect_left(buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(counts), total, count]
+                               for (name, labels), (counts, total, count) in self.histograms.items()],
+            }
+
+
+registry = Registry()
+
+
+def inc(name, amount=1, **labels):
+    registry.inc(name, amount, **labels)
+
+
+def observe(name, value, **labels):
+    registry.observe(name, value, **labels)
+
+
+def cache_hit(cache):
+    registry.inc('cache_requests_total', cache=cache, result='hit')
+
+
+def cache_miss(cache):
+    registry.inc('cache_requests_total', cache=cache, result='miss')
+
+
+@contextmanager
+def timer(name, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(name, time.perf_counter() - start, **labels)
+
+
+def metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None)
+
+
+def write_json(path, data):
+    with open(f'{path}.tmp', 'w') as output:
+        json.dump(data, output)
+    os.replace(f'{path}.tmp', path)
+
+
+def flush(force=False):
+    """Dump this process's samples for the other workers' /metrics/ endpoint"""
+    directory = metrics_dir()
+    now = time.monotonic()
+    if not directory or (not force and now - registry.last_flush < getattr(settings, 'METRICS_FLUSH_INTERVAL', 1.0)):
+        return
+    registry.last_flush = now
+    os.makedirs(directory, exist_ok=True)
+    write_json(os.path.join(directory, registry.snapshot_filename()), registry.snapshot())
+
+
+def process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Exists, owned by another user
+    return True
+
+
+def fold_exited_processes(directory):
+    """Merge the snapshots of exited processes into the archive file and remove them"""
+    if os.name != 'posix':
+        return  # No signal 0 to probe processes with
+    import fcntl
+
+    exited = [
+        filename for filename in os.listdir(directory)
+        if (match := SNAPSHOT_FILENAME.match(filename)) and not process_exists(int(match[1]))
+    ]
+    if not exited:
+        return
+
+    # Scrapes from several workers may fold at once; only one may rewrite the archive
+    with open(os.path.join(directory, 'archive.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        snapshots = []
+        for filename in [ARCHIVE_FILENAME] + exited:
+            try:
+                with open(os.path.join(directory, filename)) as snapshot:
+                    snapshots.append(json.load(snapshot))
+            except FileNotFoundError:
+                pass  # No archive yet, or already folded by another scrape
+        write_json(os.path.join(directory, ARCHIVE_FILENAME), to_snapshot(merge(snapshots)))
+        for filename in exited:
+            try:
+                os.remove(os.path.join(directory, filename))
+            except FileNotFoundError:
+                pass
+
+
+def collect():
+    """Sum the samples of every process into {name: {labels: value or histogram}}"""
+    directory = metrics_dir()
+    if directory:
+        flush(force=True)
+        fold_exited_processes(directory)
+        snapshots = []
+        for filename in os.listdir(directory):
+            if filename == ARCHIVE_FILENAME or SNAPSHOT_FILENAME.match(filename):
+                try:
+                    with open(os.path.join(directory, filename)) as snapshot:
+                        snapshots.append(json.load(snapshot))
+                except FileNotFoundError:
+                    pass  # Folded into the archive meanwhile
+    else:
+        snapshots = [registry.snapshot()]
+    return merge(snapshots)
+
+
+def merge(snapshots):
+    merged = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            series = merged.setdefault(name, {})
+            key = tuple(map(tuple, labels))
+            series[key] = series.get(key, 0) + value
+        for name, labels, counts, total, count in snapshot['histograms']:
+            series = merged.setdefault(name, {})
+            key = tuple(map(tuple, labels))
+            current = series.setdefault(key, [[0] * len(counts), 0.0, 0])
+            current[0] = [a + b for a, b in zip(current[0], counts)]
+            current[1] += total
+            current[2] += count
+    return merged
+
+
+def to_snapshot(merged):
+    """The inverse of merge for a single snapshot: back to the on-disk format"""
+    snapshot = {'counters': [], 'histograms': []}
+    for name, series in merged.items():
+        for labels, value in series.items():
+            if isinstance(value, list):
+                snapshot['histograms'].append([name, list(labels), *value])
+            else:
+                snapshot['counters'].append([name, list(labels), value])
+    return snapshot
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{escape(value)}"' for key, value in labels) + '}'
+
+
+def render():
+    """Render all metrics in the Prometheus text exposition format"""
+    merged = collect()
+    lines = []
+    for name, (metric_type, help_text, buckets) in METRICS.items():
+        series = merged.get(name)
+        if not series:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        for labels, value in sorted(series.items()):
+            if metric_type == 'counter':
+                lines.append(f'{name}{format_labels(labels)} {value}')
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", bound),))} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {total}')
+            lines.append(f'{name}_count{format_labels(labels)} {count}')
+
+    # Hit ratio per cache, derived from the lookup counters
+    lookups = {}
+    for labels, value in merged.get('cache_requests_total', {}).items():
+        labels = dict(labels)
+        hits, total = lookups.get(labels['cache'], (0, 0))
+        lookups[labels['cache']] = (hits + (value if labels['result'] == 'hit' else 0), total + value)
+    if lookups:
+        lines.append('# HELP cache_hit_ratio Fraction of cache lookups that were hits')
+        lines.append('# TYPE cache_hit_ratio gauge')
+        for cache, (hits, total) in sorted(lookups.items()):
+            lines.append(f'cache_hit_ratio{format_labels((("cache", cache),))} {hits / total}')
+    return '\n'.join(lines) + '\n'
+
+
+def instrument_templates():
+    """Time every top-level render of a Django template"""
+    from django.template.backends.django import Template
+
+    original_render = Template.render
+    if getattr(original_render, 'instrumented', False):
+        return
+
+    def render(self, context=None, request=None):
+        with timer('template_render_duration_seconds', template=self.template.name or 'unknown'):
+            return original_render(self, context, request)
+
+    render.instrumented = True
+    Template.render = render
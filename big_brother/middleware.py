@@ -0,0 +1,121 @@
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+
+from . import metrics
+from .auth import GENERATION_SESSION_KEY, ROLE_SESSION_KEY, get_session_generation
+from .profiling import StackSampler, write_profile
+
+
+class QueryTimer:
+    """Database execute wrapper counting queries and their total time"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """
+    Records per-view latency, database usage and upload sizes for the /metrics/ endpoint.
+    Should be first in MIDDLEWARE so the latency covers every other middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        query_timer = QueryTimer()
+        start = time.perf_counter()
+        with connection.execute_wrapper(query_timer):
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        if view == 'users:metrics':
+            return response
+
+        metrics.observe('http_request_duration_seconds', duration, view=view)
+        metrics.inc('http_requests_total', view=view, status=str(response.status_code))
+        metrics.inc('db_queries_total', query_timer.count, view=view)
+        metrics.inc('db_query_duration_seconds_total', query_timer.duration, view=view)
+        # Only look at uploads the view actually parsed
+        if '_files' in request.__dict__:
+            for field, upload in request.FILES.items():
+                metrics.observe('upload_size_bytes', upload.size, field=field)
+        metrics.flush()
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Samples the call stack of a fraction of requests and writes one collapsed
+    stack profile per request, grouped by URL name.
+    Admin and moderator participants, and Django staff, can force profiling of
+    a request by sending the X-Profile header.
+    Merge the results with: python manage.py profile_report
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        self.interval = getattr(settings, 'PROFILING_INTERVAL', 0.005)
+        self.directory = getattr(settings, 'PROFILING_DIR', settings.BASE_DIR / 'profiles')
+
+    def should_profile(self, request):
+        if 'HTTP_X_PROFILE' in request.META:
+            user = getattr(request, 'user', None)
+            if not (user and user.is_authenticated):
+                return False
+            # Participants log in as non-staff Users; their role is kept in the session
+            return user.is_staff or request.session.get(ROLE_SESSION_KEY) in ('admin', 'moderator')
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+
+        sampler = StackSampler(threading.get_ident(), self.interval)
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+
+        match = request.resolver_match
+        url_name = match.url_name if match and match.url_name else 'unresolved'
+        if sampler.stacks:
+            write_profile(self.directory, url_name, sampler.stacks)
+        return response
+
+
+class SessionRevocationMiddleware:
+    """
+    Ends sessions issued before their User's session generation was bumped.
+    Must come after AuthenticationMiddleware; the generation is read from the cache.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.user.is_authenticated:
+            generation = request.session.get(GENERATION_SESSION_KEY)
+            if generation is None or get_session_generation(request.user.pk) != generation:
+                # Drop this session only; logout() would also revoke the user's current sessions
+                request.session.flush()
+                request.user = AnonymousUser()
+        return self.get_response(request)
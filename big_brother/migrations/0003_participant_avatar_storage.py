@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:42
+
+import big_brother.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('big_brother', '0002_participant_description_participant_number_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='participant',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, storage=big_brother.storage.ContentAddressedStorage(), upload_to='avatars/'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('big_brother', '0003_participant_avatar_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='participant',
+            name='session_generation',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
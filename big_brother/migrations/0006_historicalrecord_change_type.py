@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('big_brother', '0005_job'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='historicalrecord',
+            name='record_type',
+            field=models.CharField(choices=[('activity', 'Activity'), ('activity_address', 'Activity Address'), ('job', 'Job'), ('job_address', 'Job Address'), ('address', 'Address'), ('change', 'Change')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:34
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('big_brother', '0007_generation'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='participant',
+            name='session_generation',
+        ),
+    ]
@@ -1,7 +1,11 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
-from django.contrib.auth.hashers import make_password, check_password
+from django.contrib.auth.hashers import make_password, check_password, identify_hasher
+from . import metrics
+from .auth import revoke_participant_sessions
+from .storage import avatar_storage
 
 
 class Participant(models.Model):
@@ -35,10 +39,12 @@ class Participant(models.Model):
                                     limit_choices_to={'role__in': ['admin', 'moderator']})
 
     # Media
-    avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    avatar = models.ImageField(upload_to='avatars/', storage=avatar_storage, blank=True, null=True)
 
     description = models.TextField(blank=True, null=True)
 
+    # Bumped to revoke every session issued so far (see big_brother.auth)
+
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -46,6 +52,15 @@ class Participant(models.Model):
     def __str__(self):
         return f"{self.username} - {self.nickname}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what sessions were issued against, to revoke them when it changes.
+        # Without both fields loaded there is nothing to compare against.
+        if 'role' in field_names and 'status' in field_names:
+            instance._loaded_access = (instance.role, instance.status)
+        return instance
+
     def get_full_name(self):
         return f"{self.first_name} {self.last_name}".strip()
 
@@ -53,13 +68,35 @@ class Participant(models.Model):
         self.password = make_password(raw_password)
 
     def check_password(self, raw_password):
-        return check_password(raw_password, self.password)
+        def setter(raw_password):
+            # The hash is from an older hasher or cost setting: upgrade it to the preferred one
+            self.set_password(raw_password)
+            self.save(update_fields=['password'])
+            metrics.inc('password_rehash_total')
+
+        return check_password(raw_password, self.password, setter)
+
+    def password_is_hashed(self):
+        """Whether the password is a hash from one of the PASSWORD_HASHERS"""
+        try:
+            identify_hasher(self.password)
+        except ValueError:
+            return False
+        return True
 
     def save(self, *args, **kwargs):
         # If password is not hashed yet, hash it
-        if not self.password.startswith('pbkdf2_sha256$'):
+        if not self.password_is_hashed():
             self.set_password(self.password)
+
+        loaded_access = getattr(self, '_loaded_access', None)
+        access_changed = loaded_access is not None and loaded_access != (self.role, self.status)
         super().save(*args, **kwargs)
+        if not {'role', 'status'} & self.get_deferred_fields():
+            self._loaded_access = (self.role, self.status)
+
+        if access_changed:
+            revoke_participant_sessions([self.username])
 
 
 class Phone(models.Model):
@@ -87,6 +124,7 @@ class HistoricalRecord(models.Model):
         ('job', 'Job'),
         ('job_address', 'Job Address'),
         ('address', 'Address'),
+        ('change', 'Change'),
     )
 
     participant = models.ForeignKey(Participant, on_delete=models.CASCADE, related_name='history')
@@ -99,3 +137,56 @@ class HistoricalRecord(models.Model):
 
     def __str__(self):
         return f"{self.participant.username} - {self.record_type} - {self.changed_at}"
+
+
+class Job(models.Model):
+    """A unit of background work, run by python manage.py run_jobs (see big_brother.jobs)"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True)
+    priority = models.IntegerField(default=0)  # Higher runs first
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    # Only one queued job may hold a given key; enqueueing it again returns that job
+    dedupe_key = models.CharField(max_length=200, blank=True, null=True)
+
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_after'], name='job_claim_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['dedupe_key'], condition=models.Q(status='queued'),
+                                    name='unique_queued_dedupe_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} - {self.status}"
+
+
+class Generation(models.Model):
+    """A named counter bumped on writes, shared by every process (see big_brother.search)"""
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField()
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
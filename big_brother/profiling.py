@@ -0,0 +1,82 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class StackSampler:
+    """Periodically records the call stack of a single thread from a background thread"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            self.stacks[frame_stack(frame)] += 1
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+def frame_stack(frame):
+    """Return the stack as a root-first tuple of frame labels"""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return tuple(labels)
+
+
+def write_profile(directory, url_name, stacks):
+    """Write samples in collapsed stack format, one file per profiled request"""
+    target = os.path.join(directory, url_name)
+    os.makedirs(target, exist_ok=True)
+    filename = f"{time.time_ns()}-{os.getpid()}-{threading.get_ident()}.folded"
+    with open(os.path.join(target, filename), 'w') as profile:
+        for stack, count in stacks.items():
+            profile.write(f"{';'.join(stack)} {count}\n")
+
+
+def read_profiles(directory, url_name):
+    """Merge every profile written for a URL name into a single Counter"""
+    stacks = Counter()
+    target = os.path.join(directory, url_name)
+    for filename in sorted(os.listdir(target)):
+        if not filename.endswith('.folded'):
+            continue
+        with open(os.path.join(target, filename)) as profile:
+            for line in profile:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack:
+                    stacks[tuple(stack.split(';'))] += int(count)
+    return stacks
+
+
+def hot_functions(stacks):
+    """Return (self samples, total samples) per frame label"""
+    self_counts = Counter()
+    total_counts = Counter()
+    for stack, count in stacks.items():
+        self_counts[stack[-1]] += count
+        # Count recursive frames once per stack
+        for label in set(stack):
+            total_counts[label] += count
+    return self_counts, total_counts
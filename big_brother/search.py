@@ -0,0 +1,255 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Exists, F, OuterRef, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import metrics
+from .models import Generation, Participant, Phone, Email, HistoricalRecord
+
+# GET parameters read by participant_filters
+SEARCH_PARAMS = (
+    'q', 'assigned_by', 'first_name', 'last_name', 'nickname', 'phone', 'email', 'status', 'role',
+    'has_record', 'activity', 'activity_address', 'job', 'job_address', 'address',
+)
+# Filters with one count per option, computed as alternatives to the current choice
+FACET_FIELDS = ('status', 'role', 'assigned_by')
+# Also counted as alternatives, from the per-record-type counts of each row
+FACET_PARAMS = FACET_FIELDS + ('has_record',)
+DATA_GENERATION_KEY = 'participant_data_generation'
+# Cached in place of the ids of a search with more than SEARCH_CACHE_MAX_IDS results
+TOO_MANY_RESULTS = 'too-many'
+
+
+def data_generation():
+    """Counter bumped on every write to the searched tables; part of every cache key here"""
+    # Kept in the database so writes from any web or run_jobs process invalidate every process's cache
+    value = Generation.objects.filter(name=DATA_GENERATION_KEY).values_list('value', flat=True).first()
+    if value is None:
+        # Seed with the clock so a counter lost with its row never reuses an old value
+        value = Generation.objects.get_or_create(name=DATA_GENERATION_KEY, defaults={'value': time.time_ns()})[0].value
+    return value
+
+
+def bump_data_generation():
+    if not Generation.objects.filter(name=DATA_GENERATION_KEY).update(value=F('value') + 1):
+        Generation.objects.get_or_create(name=DATA_GENERATION_KEY, defaults={'value': time.time_ns()})
+
+
+@receiver(post_save, sender=Participant)
+@receiver(post_delete, sender=Participant)
+@receiver(post_save, sender=Phone)
+@receiver(post_delete, sender=Phone)
+@receiver(post_save, sender=Email)
+@receiver(post_delete, sender=Email)
+@receiver(post_save, sender=HistoricalRecord)
+@receiver(post_delete, sender=HistoricalRecord)
+def invalidate_search_caches(sender, **kwargs):
+    bump_data_generation()
+
+
+def canonical_search(params):
+    """The filter parameters in a stable form: trimmed, without empties or page, sorted"""
+    items = []
+    for name in sorted(SEARCH_PARAMS):
+        value = params.get(name, '').strip()
+        if value:
+            items.append((name, value))
+    return urlencode(items)
+
+
+def search_cache_key(prefix, params):
+    digest = hashlib.md5(canonical_search(params).encode()).hexdigest()
+    return f'{prefix}:{data_generation()}:{digest}'
+
+
+def has_record(record_type):
+    return Exists(HistoricalRecord.objects.filter(participant=OuterRef('pk'), record_type=record_type))
+
+
+def participant_filters(params, skip=()):
+    """Build the participant_list filter conditions from its GET parameters"""
+    def get(name):
+        return '' if name in skip else params.get(name, '').strip()
+
+    search_query = get('q')
+    assigned_by = get('assigned_by')
+    first_name = get('first_name')
+    last_name = get('last_name')
+    nickname = get('nickname')
+    phone = get('phone')
+    email = get('email')
+    status = get('status')
+    role = get('role')
+    record_type = get('has_record')
+    activity = get('activity')
+    activity_address = get('activity_address')
+    job = get('job')
+    job_address = get('job_address')
+    address = get('address')
+
+    # Build filter conditions
+    filters = Q()
+
+    # Quick search across multiple fields
+    if search_query:
+        filters &= (
+                Q(username__icontains=search_query) |
+                Q(nickname__icontains=search_query) |
+                Q(first_name__icontains=search_query) |
+                Q(last_name__icontains=search_query) |
+                Q(phones__number__icontains=search_query) |
+                Q(emails__email__icontains=search_query) |
+                Q(history__value__icontains=search_query) |
+                Q(history__record_type__icontains=search_query)
+        )
+
+    # Specific field filters
+    if assigned_by:
+        filters &= Q(assigned_by__id=assigned_by)
+
+    if first_name:
+        filters &= Q(first_name__icontains=first_name)
+
+    if last_name:
+        filters &= Q(last_name__icontains=last_name)
+
+    if nickname:
+        filters &= Q(nickname__icontains=nickname)
+
+    if phone:
+        filters &= Q(phones__number__icontains=phone)
+
+    if email:
+        filters &= Q(emails__email__icontains=email)
+
+    if status:
+        filters &= Q(status=status)
+
+    if role:
+        filters &= Q(role=role)
+
+    # Historical record filters
+    if record_type:
+        filters &= Q(has_record(record_type))
+
+    if activity:
+        filters &= Q(history__record_type='activity', history__value__icontains=activity)
+
+    if activity_address:
+        filters &= Q(history__record_type='activity_address', history__value__icontains=activity_address)
+
+    if job:
+        filters &= Q(history__record_type='job', history__value__icontains=job)
+
+    if job_address:
+        filters &= Q(history__record_type='job_address', history__value__icontains=job_address)
+
+    if address:
+        filters &= Q(history__record_type='address', history__value__icontains=address)
+
+    return filters
+
+
+def facet_rows(params):
+    """
+    Participant counts grouped by every facet field, with the number of
+    participants having each history record type, in a single grouped query.
+    Facet fields and has_record are left unfiltered so each row can be counted
+    as an alternative to the current choice.
+    """
+    filters = participant_filters(params, skip=FACET_PARAMS)
+    if not filters:
+        cache_key = f'participant_facets:{data_generation()}'
+        rows = cache.get(cache_key)
+        if rows is not None:
+            metrics.cache_hit('participant_facets')
+            return rows
+        metrics.cache_miss('participant_facets')
+        queryset = Participant.objects.all()
+    else:
+        # Filter through a subquery so history/phone joins can't inflate the counts
+        queryset = Participant.objects.filter(pk__in=Participant.objects.filter(filters).values('pk'))
+
+    history_counts = {
+        f'history_{record_type}': Count('pk', filter=Q(has_record(record_type)))
+        for record_type, _ in HistoricalRecord.RECORD_TYPES
+    }
+    rows = list(queryset.order_by().values(*FACET_FIELDS).annotate(total=Count('pk'), **history_counts))
+
+    if not filters:
+        cache.set(cache_key, rows, getattr(settings, 'FACETS_CACHE_TIMEOUT', 60))
+    return rows
+
+
+def search_result_ids(params):
+    """
+    Ordered ids of the participants matching the filters, cached per canonical
+    search and data generation so every page of a repeated search skips the
+    filter, DISTINCT and COUNT. Returns None when there are too many to cache.
+    """
+    cache_key = search_cache_key('participant_search', params)
+    ids = cache.get(cache_key)
+    if ids is not None:
+        metrics.cache_hit('participant_search')
+        return None if ids == TOO_MANY_RESULTS else ids
+    metrics.cache_miss('participant_search')
+
+    participants = Participant.objects.order_by('-updated_at')
+    filters = participant_filters(params)
+    if filters:
+        participants = participants.filter(filters).distinct()
+
+    limit = getattr(settings, 'SEARCH_CACHE_MAX_IDS', 10000)
+    ids = list(participants.values_list('id', flat=True)[:limit + 1])
+    if len(ids) > limit:
+        # Remember it, so the ids aren't fetched and thrown away on every request
+        ids = TOO_MANY_RESULTS
+    cache.set(cache_key, ids, getattr(settings, 'SEARCH_CACHE_TIMEOUT', 300))
+    return None if ids == TOO_MANY_RESULTS else ids
+
+
+def participant_facets(params, assigners):
+    """Counts per option of each facet under the current filters, ready for the template"""
+    selected = {field: params.get(field, '').strip() for field in FACET_FIELDS}
+    selected_record = params.get('has_record', '').strip()
+    counts = {field: {} for field in FACET_FIELDS}
+    record_counts = {}
+
+    for row in facet_rows(params):
+        # Participants of this row that have the chosen record type, if one is chosen
+        matching = row.get(f'history_{selected_record}', 0) if selected_record else row['total']
+        misses = [field for field in FACET_FIELDS if selected[field] and str(row[field]) != selected[field]]
+        if not misses:
+            for field in FACET_FIELDS:
+                counts[field][row[field]] = counts[field].get(row[field], 0) + matching
+            # Alternatives to the chosen record type: every record type, regardless of the choice
+            for record_type, _ in HistoricalRecord.RECORD_TYPES:
+                record_counts[record_type] = record_counts.get(record_type, 0) + row[f'history_{record_type}']
+        elif len(misses) == 1:
+            # Would match if only this field's choice changed
+            field = misses[0]
+            counts[field][row[field]] = counts[field].get(row[field], 0) + matching
+
+    def options(choices, field_counts, current):
+        return [
+            {'value': str(value), 'label': label, 'count': field_counts.get(value, 0),
+             'selected': current == str(value)}
+            for value, label in choices
+        ]
+
+    assigner_choices = [(assigner.id, f'{assigner.nickname} ({assigner.username})') for assigner in assigners]
+    return {
+        'status': {'param': 'status', 'label': 'Status',
+                   'options': options(Participant.USER_STATUS, counts['status'], selected['status'])},
+        'role': {'param': 'role', 'label': 'Role',
+                 'options': options(Participant.ROLE_CHOICES, counts['role'], selected['role'])},
+        'assigned_by': {'param': 'assigned_by', 'label': 'Assigned By',
+                        'options': options(assigner_choices, counts['assigned_by'], selected['assigned_by'])},
+        'has_record': {'param': 'has_record', 'label': 'Has Record',
+                       'options': options(HistoricalRecord.RECORD_TYPES, record_counts, selected_record)},
+    }
@@ -0,0 +1,72 @@
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import FileSystemStorage
+from django.utils.functional import cached_property
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.ttf', '.eot', '.map')
+# (Accept-Encoding token, file suffix), in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def accepts_encoding(header, coding):
+    """Whether an Accept-Encoding header allows a content coding; q=0 refuses it"""
+    qualities = {}
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            qualities[name.strip().lower()] = quality
+    # An explicit entry wins over the * wildcard
+    return qualities.get(coding, qualities.get('*', 0.0)) > 0
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage (content-hashed names) that also writes .gz and .br
+    variants of text assets during collectstatic, for serve_static to pick from.
+    """
+
+    @cached_property
+    def versioned_names(self):
+        return set(self.hashed_files.values())
+
+    def url(self, name, force=False):
+        if not self.hashed_files and not force:
+            # collectstatic has not run (development, tests): there are no versioned names yet
+            return FileSystemStorage.url(self, name)
+        return super().url(name, force)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        # Compress once every pass has finished rewriting the hashed files
+        for name in set(self.hashed_files) | set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                self.compress(name)
+
+    def compress(self, name):
+        path = self.path(name)
+        with open(path, 'rb') as source:
+            data = source.read()
+        variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(data)
+        for suffix, compressed in variants.items():
+            # Not worth a Content-Encoding round trip if it barely shrinks
+            if len(compressed) < len(data) * 0.95:
+                with open(path + suffix, 'wb') as output:
+                    output.write(compressed)
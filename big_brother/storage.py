@@ -0,0 +1,95 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.utils.deconstruct import deconstructible
+
+CHUNK_SIZE = 64 * 1024
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams large uploads to a temporary file while hashing them, so the
+    storage can store the blob without reading it a second time.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        upload = super().file_complete(file_size)
+        upload.content_hash = self.hasher.hexdigest()
+        return upload
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores each file once under the SHA-256 of its content, e.g.
+    avatars/3f/3fa2...c9.jpg. Saving identical content again returns the
+    existing name, so participants sharing a photo share one blob and the
+    served URLs never change content (safe for far-future caching).
+    Blobs are never deleted on save; unreferenced ones are removed by
+    python manage.py gc_avatars
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in _save
+        return name
+
+    def _save(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        content_hash = getattr(content, 'content_hash', None)
+
+        streamed = content_hash is not None and hasattr(content, 'temporary_file_path')
+        if streamed:
+            # Already hashed while streaming in; move it into place
+            source = content.temporary_file_path()
+        else:
+            source, content_hash = self._write_hashed(content)
+
+        name = os.path.join(directory, content_hash[:2], f'{content_hash}{extension}')
+        full_path = self.path(name)
+        try:
+            # Mark the blob fresh so gc_avatars can't delete it before the new row is committed
+            os.utime(full_path)
+        except FileNotFoundError:
+            pass
+        else:
+            # Deduplicated; the upload handler cleans up its own temporary file
+            if not streamed:
+                os.remove(source)
+            return name
+
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        file_move_safe(source, full_path, allow_overwrite=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return name
+
+    def _write_hashed(self, content):
+        """Copy content to a temporary file in chunks while hashing it"""
+        os.makedirs(self.location, exist_ok=True)
+        hasher = hashlib.sha256()
+        descriptor, temporary_path = tempfile.mkstemp(dir=self.location, suffix='.upload')
+        try:
+            with os.fdopen(descriptor, 'wb') as output:
+                for chunk in content.chunks(CHUNK_SIZE):
+                    hasher.update(chunk)
+                    output.write(chunk)
+        except Exception:
+            os.remove(temporary_path)
+            raise
+        return temporary_path, hasher.hexdigest()
+
+
+avatar_storage = ContentAddressedStorage()
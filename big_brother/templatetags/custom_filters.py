@@ -2,6 +2,15 @@ from django import template
 
 register = template.Library()
 
+# Also read by the build_icons command to decide which icons to ship
+RECORD_ICONS = {
+    'activity': 'fa-running',
+    'activity_address': 'fa-map-marker-alt',
+    'job': 'fa-briefcase',
+    'job_address': 'fa-building',
+    'address': 'fa-home'
+}
+
 @register.filter
 def first_record(history, record_type):
     """Return the first record of a specific type from history"""
@@ -25,11 +34,4 @@ def record_color(record_type):
 @register.filter
 def record_icon(record_type):
     """Return an icon based on record type"""
-    icon_map = {
-        'activity': 'fa-running',
-        'activity_address': 'fa-map-marker-alt',
-        'job': 'fa-briefcase',
-        'job_address': 'fa-building',
-        'address': 'fa-home'
-    }
-    return icon_map.get(record_type, 'fa-history')
+    return RECORD_ICONS.get(record_type, 'fa-history')
@@ -21,3 +21,13 @@ def query_string(context, **kwargs):
             query_dict[key] = value
 
     return urlencode(query_dict)
+
+
+@register.simple_tag(takes_context=True)
+def refine_query_string(context, param, value, selected=False):
+    """
+    Builds the query string for a facet refinement: selects the value, or clears it when
+    already selected, and returns to the first page.
+    Usage: {% refine_query_string 'status' option.value option.selected %}
+    """
+    return query_string(context, **{param: None if selected else value, 'page': None})
@@ -1,3 +1,602 @@
-from django.test import TestCase
+import os
+import re
+import subprocess
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import QueryDict
+from django.shortcuts import render
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import metrics
+from .admin import CappedCountPaginator, HistoricalRecordAdmin
+from .bulk import bulk_update, target_participants
+from .forms import ParticipantForm
+from .jobs import HANDLERS, claim_job, enqueue, heartbeat, record_history, run_job, schedule_periodic_jobs
+from .management.commands import build_icons
+from .middleware import ProfilingMiddleware
+from .models import Participant, Phone, Email, HistoricalRecord, Job
+from .search import participant_facets, search_result_ids
+
+
+class AdminQueryCountTests(TestCase):
+    """Admin pages must issue a bounded number of queries regardless of data size"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = User.objects.create_superuser('root', 'root@example.com', 'secret')
+        cls.moderator = Participant.objects.create(
+            username='mod', password='secret', nickname='Mod', role='moderator'
+        )
+        for i in range(30):
+            participant = Participant.objects.create(
+                username=f'user{i}', password='secret', nickname=f'User {i}', assigned_by=cls.moderator
+            )
+            Phone.objects.create(participant=participant, number='+123456789')
+            Email.objects.create(participant=participant, email=f'user{i}@example.com')
+        cls.participant = participant
+        HistoricalRecord.objects.bulk_create([
+            HistoricalRecord(participant=cls.participant, record_type='job', value=f'Job {i}')
+            for i in range(60)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.superuser)
+
+    def assertMaxQueries(self, limit, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(context.captured_queries), limit,
+            '\n'.join(query['sql'] for query in context.captured_queries)
+        )
+        return response
+
+    def test_participant_changelist(self):
+        self.assertMaxQueries(10, reverse('admin:big_brother_participant_changelist'))
+
+    def test_participant_change_page(self):
+        url = reverse('admin:big_brother_participant_change', args=[self.participant.pk])
+        response = self.assertMaxQueries(20, url)
+        # Only the most recent history records are rendered inline
+        self.assertEqual(response.context['inline_admin_formsets'][2].formset.initial_form_count(), 20)
+
+    def test_historical_record_changelist(self):
+        self.assertMaxQueries(10, reverse('admin:big_brother_historicalrecord_changelist'))
+
+    def test_changelist_count_is_capped(self):
+        with mock.patch.object(CappedCountPaginator, 'count_cap', 50):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(reverse('admin:big_brother_historicalrecord_changelist'))
+        self.assertEqual(response.context['cl'].result_count, 50)
+        self.assertContains(response, '50+ historical records')
+        counts = [query['sql'] for query in context.captured_queries if 'COUNT(' in query['sql']]
+        self.assertTrue(counts)
+        self.assertTrue(all('LIMIT' in sql for sql in counts), counts)
+
+    def test_pages_past_the_cap_stay_reachable(self):
+        url = reverse('admin:big_brother_historicalrecord_changelist')
+        with mock.patch.object(CappedCountPaginator, 'count_cap', 20), \
+                mock.patch.object(HistoricalRecordAdmin, 'list_per_page', 10):
+            response = self.client.get(url, {'p': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cl'].result_list), 10)
+        # The count extends past the page being viewed
+        self.assertContains(response, '60 historical records')
+
+    def test_historical_record_change_page(self):
+        record = self.participant.history.first()
+        url = reverse('admin:big_brother_historicalrecord_change', args=[record.pk])
+        self.assertMaxQueries(10, url)
+
+
+class ProfilingMiddlewareTests(TestCase):
+
+    def test_staff_header_writes_profile_and_report_merges_it(self):
+        staff = User.objects.create_user('staff', password='secret', is_staff=True)
+        self.client.force_login(staff)
+        def slow_render(*args, **kwargs):
+            # Give the sampler thread time to take a few samples
+            time.sleep(0.05)
+            return render(*args, **kwargs)
+
+        with tempfile.TemporaryDirectory() as directory, \
+                self.settings(PROFILING_DIR=directory, PROFILING_INTERVAL=0.001), \
+                mock.patch('big_brother.views.render', slow_render):
+            self.client.get(reverse('users:participant_list'), HTTP_X_PROFILE='1')
+            self.assertTrue(os.listdir(os.path.join(directory, 'participant_list')))
+
+            output = StringIO()
+            collapsed = os.path.join(directory, 'merged.folded')
+            call_command('profile_report', 'participant_list', collapsed=collapsed, stdout=output)
+            self.assertIn('participant_list (', output.getvalue())
+            with open(collapsed) as merged:
+                self.assertTrue(merged.readline().startswith('participant_list;'))
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_header_is_honored_for_admin_participants_only(self):
+        cache.clear()
+        for username, role in [('admin', 'admin'), ('viewer', 'viewer')]:
+            Participant.objects.create(username=username, password='secret', nickname=username, role=role)
+        middleware = ProfilingMiddleware(lambda request: None)
+        with tempfile.TemporaryDirectory() as directory, self.settings(PROFILING_DIR=directory):
+            for username, expected in [('admin', True), ('viewer', False)]:
+                client = Client()
+                client.post(reverse('users:login'), {'username': username, 'password': 'secret'})
+                request = client.get(reverse('users:dashboard'), HTTP_X_PROFILE='1').wsgi_request
+                self.assertEqual(middleware.should_profile(request), expected)
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        metrics.registry.counters.clear()
+        metrics.registry.histograms.clear()
+
+    def test_endpoint_merges_worker_snapshots(self):
+        exited = subprocess.Popen(['true'])
+        exited.wait()
+        with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_DIR=directory):
+            # Snapshots left behind by another, exited worker process and an earlier fold
+            with open(os.path.join(directory, f'metrics-{exited.pid}-abc123.json'), 'w') as snapshot:
+                snapshot.write('{"counters": [["http_requests_total", [["status", "200"], '
+                               '["view", "users:participant_list"]], 2]], "histograms": []}')
+            with open(os.path.join(directory, metrics.ARCHIVE_FILENAME), 'w') as snapshot:
+                snapshot.write('{"counters": [["http_requests_total", [["status", "200"], '
+                               '["view", "users:participant_list"]], 5]], "histograms": []}')
+
+            self.client.get(reverse('users:participant_list'))
+            response = self.client.get(reverse('users:metrics'))
+            # The exited process's file was folded into the archive
+            self.assertEqual(
+                sorted(filename for filename in os.listdir(directory) if filename.endswith('.json')),
+                sorted([metrics.ARCHIVE_FILENAME, metrics.registry.snapshot_filename()])
+            )
+            # A second scrape doesn't count the folded samples twice
+            self.assertIn('http_requests_total{status="200",view="users:participant_list"} 8',
+                          self.client.get(reverse('users:metrics')).content.decode())
+
+        body = response.content.decode()
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertIn('http_requests_total{status="200",view="users:participant_list"} 8', body)
+        self.assertIn('http_request_duration_seconds_bucket{view="users:participant_list",le="+Inf"}', body)
+        self.assertIn('db_queries_total{view="users:participant_list"}', body)
+        self.assertIn('template_render_duration_seconds_count{template="users/participant_list.html"}', body)
+
+
+    def test_endpoint_is_restricted(self):
+        url = reverse('users:metrics')
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='203.0.113.5').status_code, 403)
+        with self.settings(METRICS_TOKEN='scrape-token'):
+            self.assertEqual(self.client.get(url, REMOTE_ADDR='203.0.113.5',
+                                             HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.client.get(url, REMOTE_ADDR='203.0.113.5',
+                                             HTTP_AUTHORIZATION='Bearer scrape-token').status_code, 200)
+
+
+class AvatarStorageTests(TestCase):
+
+    def test_identical_uploads_share_one_blob_until_collected(self):
+        with tempfile.TemporaryDirectory() as media_root, self.settings(MEDIA_ROOT=media_root):
+            first = Participant.objects.create(username='first', password='secret', nickname='First')
+            second = Participant.objects.create(username='second', password='secret', nickname='Second')
+            first.avatar.save('photo.JPG', ContentFile(b'same image'))
+            second.avatar.save('other.jpg', ContentFile(b'same image'))
+
+            self.assertEqual(first.avatar.name, second.avatar.name)
+            self.assertRegex(first.avatar.name, r'^avatars/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+
+            first.avatar.save('new.jpg', ContentFile(b'new image'))
+            second.avatar.save('new.jpg', ContentFile(b'new image'))
+            call_command('gc_avatars', min_age=0, stdout=StringIO())
+
+            self.assertTrue(os.path.exists(first.avatar.path))
+            self.assertEqual(
+                sum(len(files) for _, _, files in os.walk(os.path.join(media_root, 'avatars'))), 1
+            )
+
+    def test_deduplicated_upload_refreshes_blob_age(self):
+        with tempfile.TemporaryDirectory() as media_root, self.settings(MEDIA_ROOT=media_root):
+            participant = Participant.objects.create(username='user', password='secret', nickname='User')
+            participant.avatar.save('photo.jpg', ContentFile(b'image'))
+            os.utime(participant.avatar.path, (0, 0))  # An old blob, about to become unreferenced
+            participant.avatar.save('again.jpg', ContentFile(b'image'))
+            self.assertGreater(os.path.getmtime(participant.avatar.path), time.time() - 60)
+
+
+class StaticAssetTests(TestCase):
+
+    def test_collected_assets_are_versioned_precompressed_and_immutable(self):
+        with tempfile.TemporaryDirectory() as static_root, self.settings(STATIC_ROOT=static_root):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            html = self.client.get(reverse('users:login')).content.decode()
+            self.assertNotIn('https://', html)
+            url = re.search(r'href="(/static/vendor/bootstrap/bootstrap\.min\.[0-9a-f]{12}\.css)"', html).group(1)
+
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(response['Content-Type'], 'text/css')
+            self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+            # q=0 refuses a coding
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0, br;q=0')
+            self.assertFalse(response.has_header('Content-Encoding'))
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='br;q=0, *;q=0.5')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+
+            response = self.client.get('/static/vendor/bootstrap/bootstrap.min.css')
+            self.assertFalse(response.has_header('Content-Encoding'))
+            self.assertEqual(response['Cache-Control'], 'no-cache')
+
+    def test_icon_subset_covers_every_used_icon(self):
+        with open(os.path.join(build_icons.SOURCE_DIR, 'fontawesome.css')) as source:
+            available = {match.group(1) for match in build_icons.ICON_RULE.finditer(source.read())}
+        with open(os.path.join(build_icons.OUTPUT_DIR, 'css', 'icons.css')) as subset:
+            shipped = {match.group(1) for match in build_icons.ICON_RULE.finditer(subset.read())}
+        # Run python manage.py build_icons after using a new icon
+        self.assertEqual((build_icons.Command().used_icon_names() & available) - shipped, set())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AuthFastPathTests(TestCase):
+
+    def setUp(self):
+        # The cache outlives each test's rolled back transaction
+        cache.clear()
+        self.participant = Participant.objects.create(
+            username='admin', password='secret', nickname='Admin', role='admin'
+        )
+        self.client.post(reverse('users:login'), {'username': 'admin', 'password': 'secret'})
+        self.detail_url = reverse('users:participant_detail', args=[self.participant.pk])
+
+    def test_authenticated_request_needs_no_session_or_auth_queries(self):
+        self.client.get(reverse('users:dashboard'))
+        # Only the dashboard's own three counts
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('users:dashboard'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_role_change_revokes_session(self):
+        self.assertEqual(self.client.get(self.detail_url).status_code, 200)
+        participant = Participant.objects.get(pk=self.participant.pk)
+        participant.role = 'viewer'
+        participant.save()
+        self.assertRedirects(self.client.get(self.detail_url), f"{reverse('users:login')}?next={self.detail_url}",
+                             fetch_redirect_response=False)
+
+    def test_role_change_saved_with_update_fields_revokes_session(self):
+        self.assertEqual(self.client.get(self.detail_url).status_code, 200)
+        participant = Participant.objects.get(pk=self.participant.pk)
+        participant.role = 'viewer'
+        participant.save(update_fields=['role'])
+        self.assertEqual(self.client.get(self.detail_url).status_code, 302)
+
+    def test_saving_with_deferred_access_fields_keeps_sessions(self):
+        participant = Participant.objects.only('id', 'nickname', 'password').get(pk=self.participant.pk)
+        participant.nickname = 'Renamed'
+        # The UPDATE and the search data generation bump; the deferred fields aren't loaded
+        with self.assertNumQueries(2):
+            participant.save()
+        self.assertEqual(self.client.get(self.detail_url).status_code, 200)
+
+    def test_logout_revokes_copied_session_cookie(self):
+        stolen = self.client.cookies['sessionid'].value
+        self.client.get(reverse('users:logout'))
+        self.client.cookies['sessionid'] = stolen
+        response = self.client.get(reverse('users:dashboard'))
+        self.assertEqual(response.status_code, 302)
+
+
+class AdminSessionRevocationTests(TestCase):
+
+    def test_admin_logout_revokes_copied_session_cookie(self):
+        User.objects.create_superuser('root', 'root@example.com', 'secret')
+        self.client.post(reverse('admin:login'), {'username': 'root', 'password': 'secret'})
+        self.assertEqual(self.client.get(reverse('admin:index')).status_code, 200)
+        stolen = self.client.cookies['sessionid'].value
+        self.client.post(reverse('admin:logout'))
+        self.client.cookies['sessionid'] = stolen
+        self.assertEqual(self.client.get(reverse('admin:index')).status_code, 302)
+
+
+class ParticipantFacetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.moderator = Participant.objects.create(username='mod', password='secret', nickname='Mod', role='moderator')
+        for i, (status, role) in enumerate([('active', 'viewer'), ('active', 'simple'), ('inactive', 'simple')]):
+            participant = Participant.objects.create(
+                username=f'user{i}', password='secret', nickname=f'User {i}', status=status, role=role,
+                assigned_by=cls.moderator
+            )
+            HistoricalRecord.objects.create(participant=participant, record_type='job', value='Baker')
+            HistoricalRecord.objects.create(participant=participant, record_type='job', value='Cook')
+
+    def setUp(self):
+        cache.clear()
+        self.assigners = list(Participant.objects.filter(role='moderator'))
+
+    def facet_counts(self, params):
+        facets = participant_facets(QueryDict(params), self.assigners)
+        return {
+            param: {option['value']: option['count'] for option in facet['options']}
+            for param, facet in facets.items()
+        }
+
+    def test_counts_are_alternatives_to_the_current_choice(self):
+        # The data generation and the grouped counts
+        with self.assertNumQueries(2):
+            counts = self.facet_counts('status=active&role=simple')
+        # Status counts keep role=simple, role counts keep status=active
+        self.assertEqual(counts['status'], {'active': 1, 'inactive': 1})
+        self.assertEqual(counts['role']['simple'], 1)
+        self.assertEqual(counts['role']['viewer'], 1)
+        self.assertEqual(counts['role']['moderator'], 1)
+        self.assertEqual(counts['assigned_by'], {str(self.moderator.pk): 1})
+        # Participants with two job records are counted once
+        self.assertEqual(counts['has_record']['job'], 1)
+
+    def test_unfiltered_counts_are_cached(self):
+        self.facet_counts('')
+        # Only the data generation is read
+        with self.assertNumQueries(1):
+            counts = self.facet_counts('status=inactive')
+        self.assertEqual(counts['role']['simple'], 1)
+        self.assertEqual(counts['status'], {'active': 3, 'inactive': 1})
+
+    def test_filtered_counts_ignore_join_duplicates(self):
+        counts = self.facet_counts('q=o')
+        self.assertEqual(counts['status'], {'active': 3, 'inactive': 1})
+        self.assertEqual(counts['has_record']['job'], 3)
+
+    def test_record_type_counts_are_alternatives(self):
+        other = Participant.objects.create(username='other', password='secret', nickname='Other', role='simple')
+        HistoricalRecord.objects.create(participant=other, record_type='address', value='Main St')
+        counts = self.facet_counts('has_record=job')
+        # Choosing Address instead of Job would show the one participant with an address record
+        self.assertEqual(counts['has_record']['job'], 3)
+        self.assertEqual(counts['has_record']['address'], 1)
+        # The other facets still count only participants with a job record
+        self.assertEqual(counts['status'], {'active': 2, 'inactive': 1})
+        self.assertEqual(counts['role']['simple'], 2)
+
+    def test_list_renders_refinement_links(self):
+        response = self.client.get(reverse('users:participant_list'), {'status': 'active', 'page': '1'})
+        self.assertContains(response, 'href="?status=active&amp;role=simple"')
+        self.assertContains(response, 'href="?"')
+
+
+class SearchResultCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(30):
+            participant = Participant.objects.create(username=f'user{i}', password='secret', nickname=f'User {i}')
+            Phone.objects.create(participant=participant, number=f'+1555000{i:04d}')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_equivalent_searches_share_one_entry(self):
+        ids = search_result_ids(QueryDict('q=user&page=2&status='))
+        # Only the data generation is read
+        with self.assertNumQueries(1):
+            self.assertEqual(search_result_ids(QueryDict('q=%20user%20')), ids)
+        self.assertEqual(len(ids), 30)
+
+    def test_writes_invalidate_cached_results(self):
+        self.assertEqual(len(search_result_ids(QueryDict('phone=1555'))), 30)
+        Phone.objects.filter(number='+15550000000').get().delete()
+        self.assertEqual(len(search_result_ids(QueryDict('phone=1555'))), 29)
+
+    @override_settings(SEARCH_CACHE_MAX_IDS=10)
+    def test_too_many_results_are_remembered(self):
+        self.assertIsNone(search_result_ids(QueryDict('q=user')))
+        with self.assertNumQueries(1):
+            self.assertIsNone(search_result_ids(QueryDict('q=user')))
+
+    def test_cached_page_is_one_participant_fetch(self):
+        url = reverse('users:participant_list')
+        self.client.get(url, {'q': 'user'})
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, {'q': 'user', 'page': '2'})
+        participant_queries = [
+            query['sql'] for query in context.captured_queries
+            if 'FROM "big_brother_participant"' in query['sql'] and 'GROUP BY' not in query['sql']
+        ]
+        # The page fetch plus the assigners for the filter dropdown
+        self.assertEqual(len(participant_queries), 2)
+        self.assertEqual(len(response.context['participants']), 5)
+        self.assertEqual(response.context['participants'].paginator.count, 30)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], JOBS_RUN_INLINE=False)
+class JobQueueTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.participant = Participant.objects.create(username='user', password='secret', nickname='User')
+
+    def test_enqueue_deduplicates_queued_jobs(self):
+        first = enqueue('warm_facets', dedupe_key='warm_facets')
+        self.assertEqual(enqueue('warm_facets', dedupe_key='warm_facets'), first)
+        run_job(claim_job('worker'))
+        self.assertNotEqual(enqueue('warm_facets', dedupe_key='warm_facets'), first)
+
+    def test_claims_by_priority_once(self):
+        low = enqueue('warm_facets')
+        high = enqueue('warm_facets', priority=5)
+        self.assertEqual(claim_job('worker-1'), high)
+        self.assertEqual(claim_job('worker-2'), low)
+        self.assertIsNone(claim_job('worker-3'))
+
+    def test_failed_job_is_retried_with_backoff(self):
+        queued = enqueue('record_history', {'participant_id': self.participant.pk}, max_attempts=2)
+        self.assertEqual(run_job(claim_job('worker')), Job.QUEUED)
+        queued.refresh_from_db()
+        self.assertGreater(queued.run_after, timezone.now())
+        self.assertIn('TypeError', queued.last_error)
+
+        Job.objects.filter(pk=queued.pk).update(run_after=timezone.now())
+        self.assertEqual(run_job(claim_job('worker')), Job.FAILED)
+
+    def test_heartbeat_keeps_long_jobs_from_being_reclaimed(self):
+        def long_job(reclaim=False):
+            # As if the job had run past JOB_LOCK_TIMEOUT
+            Job.objects.update(locked_at=timezone.now() - timedelta(days=1))
+            if reclaim:
+                Job.objects.update(locked_by='worker-2')
+            heartbeat()
+            self.assertIsNone(claim_job('worker-2'))
+
+        with mock.patch.dict(HANDLERS, {'long_job': long_job}):
+            enqueue('long_job')
+            self.assertEqual(run_job(claim_job('worker-1')), Job.DONE)
+
+            # A job whose lock was lost stops at its next heartbeat and leaves the job to its new owner
+            reclaimed = enqueue('long_job', {'reclaim': True})
+            run_job(claim_job('worker-1'))
+            reclaimed.refresh_from_db()
+            self.assertEqual((reclaimed.status, reclaimed.locked_by), (Job.RUNNING, 'worker-2'))
+
+    @override_settings(JOBS_RUN_INLINE=True)
+    def test_jobs_run_inline_without_workers(self):
+        queued = enqueue('record_history', {'participant_id': self.participant.pk, 'values': {'job': 'Baker'}})
+        self.assertEqual(queued.status, Job.DONE)
+        self.assertEqual(queued.locked_by, '')
+        self.assertTrue(self.participant.history.filter(record_type='job', value='Baker').exists())
+
+    def test_periodic_jobs_queue_once_per_generation_and_interval(self):
+        schedule_periodic_jobs()
+        schedule_periodic_jobs()
+        self.assertEqual(sorted(Job.objects.values_list('kind', flat=True)), ['gc_avatars', 'warm_facets'])
+
+        Participant.objects.create(username='other', password='secret', nickname='Other')  # Bumps the generation
+        old = enqueue('warm_facets')
+        Job.objects.filter(pk=old.pk).update(status=Job.DONE, finished_at=timezone.now() - timedelta(days=30))
+        schedule_periodic_jobs()
+        self.assertEqual(Job.objects.filter(kind='warm_facets').count(), 2)
+        self.assertFalse(Job.objects.filter(pk=old.pk).exists())
+
+    def test_record_history_skips_unchanged_values(self):
+        HistoricalRecord.objects.create(participant=self.participant, record_type='job', value='Baker')
+        record_history(self.participant.pk, {'job': 'Baker', 'address': 'Main St', 'activity': None})
+        self.assertEqual(
+            sorted(self.participant.history.values_list('record_type', 'value')),
+            [('address', 'Main St'), ('job', 'Baker')]
+        )
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BulkActionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.admin = Participant.objects.create(username='admin', password='secret', nickname='Admin', role='admin')
+        self.participants = [
+            Participant.objects.create(username=f'user{i}', password='secret', nickname=f'User {i}')
+            for i in range(5)
+        ]
+        self.client.post(reverse('users:login'), {'username': 'admin', 'password': 'secret'})
+
+    @override_settings(BULK_ACTION_CHUNK_SIZE=2)
+    def test_updates_in_chunks_with_history(self):
+        with CaptureQueriesContext(connection) as queries:
+            updated = bulk_update(target_participants(query='q=user'), {'role': 'viewer'}, 'admin')
+        self.assertEqual(updated, 5)
+        self.assertEqual(
+            sum(query['sql'].startswith('UPDATE "big_brother_participant"') for query in queries.captured_queries), 3
+        )
+        self.assertEqual(Participant.objects.filter(role='viewer').count(), 5)
+        self.assertEqual(HistoricalRecord.objects.filter(record_type='change').count(), 5)
+
+    def test_empty_selection_updates_nothing(self):
+        self.assertEqual(bulk_update(target_participants(ids=[]), {'status': 'inactive'}, 'admin'), 0)
+        self.assertFalse(Participant.objects.filter(status='inactive').exists())
+
+    def test_access_change_revokes_sessions(self):
+        bulk_update(target_participants(ids=[self.participants[0].pk]), {'role': 'viewer'}, 'admin')
+        viewer = Client()
+        viewer.post(reverse('users:login'), {'username': 'user0', 'password': 'secret'})
+        self.assertEqual(viewer.get(reverse('users:dashboard')).status_code, 200)
+        bulk_update(target_participants(ids=[self.participants[0].pk]), {'status': 'inactive'}, 'admin')
+        self.assertEqual(viewer.get(reverse('users:dashboard')).status_code, 302)
+
+    def test_selected_participants_are_updated_inline(self):
+        selected = [participant.pk for participant in self.participants[:2]]
+        response = self.client.post(reverse('users:participant_bulk_action'), {
+            'action': 'set_status', 'scope': 'selected', 'status': 'inactive', 'date_inactive': '2024-01-31',
+            'ids': selected, 'query': 'q=user',
+        })
+        self.assertRedirects(response, f"{reverse('users:participant_list')}?q=user", fetch_redirect_response=False)
+        self.assertEqual(
+            list(Participant.objects.filter(status='inactive').order_by('pk').values_list('pk', flat=True)), selected
+        )
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(JOBS_RUN_INLINE=False)
+    def test_all_matching_participants_are_updated_by_a_job(self):
+        self.client.post(reverse('users:participant_bulk_action'), {
+            'action': 'reassign', 'scope': 'all', 'assigned_by': self.admin.pk, 'query': 'q=user',
+        })
+        self.assertEqual(run_job(claim_job('worker')), Job.DONE)
+        self.assertEqual(Participant.objects.filter(assigned_by=self.admin).count(), 5)
+
+
+@override_settings(PASSWORD_HASHERS=[
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+])
+class PasswordHashingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_hash_from_any_configured_hasher_is_kept(self):
+        encoded = make_password('secret', hasher='scrypt')
+        participant = Participant.objects.create(username='user', password=encoded, nickname='User', role='admin')
+        self.assertEqual(participant.password, encoded)
+        self.assertTrue(participant.check_password('secret'))
+
+    def test_raw_password_is_hashed_with_preferred_hasher(self):
+        participant = Participant.objects.create(username='user', password='secret', nickname='User')
+        self.assertEqual(identify_hasher(participant.password).algorithm, 'md5')
+
+    def test_outdated_hash_is_upgraded_on_login(self):
+        Participant.objects.create(
+            username='user', password=make_password('secret', hasher='scrypt'), nickname='User', role='admin'
+        )
+        response = self.client.post(reverse('users:login'), {'username': 'user', 'password': 'secret'})
+        self.assertRedirects(response, reverse('users:dashboard'), fetch_redirect_response=False)
+        participant = Participant.objects.get(username='user')
+        self.assertEqual(identify_hasher(participant.password).algorithm, 'md5')
+        self.assertTrue(participant.check_password('secret'))
+        self.assertRegex(self.client.get(reverse('users:metrics')).content.decode(),
+                         r'(?m)^password_rehash_total [1-9]')
+
+    def test_edit_without_password_keeps_it(self):
+        participant = Participant.objects.create(username='user', password='secret', nickname='User', role='admin')
+        form = ParticipantForm({'number_id': 1, 'username': 'user', 'nickname': 'Renamed', 'status': 'active', 'role': 'admin',
+                                'password': '', 'confirm_password': ''}, instance=participant)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.assertTrue(Participant.objects.get(pk=participant.pk).check_password('secret'))
+
+    def test_bench_login(self):
+        out = StringIO()
+        call_command('bench_login', logins=2, hashers=['django.contrib.auth.hashers.MD5PasswordHasher'], stdout=out)
+        self.assertIn('logins/sec per core', out.getvalue())
+        self.assertFalse(Participant.objects.filter(username='bench-login').exists())
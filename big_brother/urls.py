@@ -8,7 +8,9 @@ urlpatterns = [
     path('logout/', views.custom_logout, name='logout'),
     path('', views.dashboard, name='dashboard'),
     path('participants/', views.participant_list, name='participant_list'),
+    path('participants/bulk/', views.participant_bulk_action, name='participant_bulk_action'),
     path('participants/create/', views.participant_create, name='participant_create'),
     path('participants/<int:participant_id>/', views.participant_detail, name='participant_detail'),
     path('participants/<int:participant_id>/edit/', views.participant_edit, name='participant_edit'),
+    path('metrics/', views.metrics_view, name='metrics'),
 ]
@@ -1,11 +1,31 @@
+import mimetypes
+import os
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
 from django.core.paginator import Paginator
-from django.db.models import Q
-from django.shortcuts import render, get_object_or_404, redirect
+from django.shortcuts import render, get_object_or_404, redirect, resolve_url
+from django.urls import reverse
+from django.views.decorators.http import require_POST
 from django.contrib.auth import login, logout
-from django.contrib.auth.decorators import login_required, user_passes_test
+from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib import messages
-from .models import Participant, Phone, Email, HistoricalRecord
-from .forms import ParticipantForm, PhoneFormSet, EmailFormSet
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date
+from django.views.static import serve, was_modified_since
+from . import metrics
+from .auth import ROLE_SESSION_KEY, start_participant_session
+from .bulk import bulk_update, target_participants
+from .models import Participant, Phone, Email, HistoricalRecord, Job
+from .search import canonical_search, participant_filters, participant_facets, search_result_ids
+from .forms import ParticipantForm, PhoneFormSet, EmailFormSet, BulkActionForm
+from .jobs import enqueue, record_history
+from .staticfiles import ENCODINGS, accepts_encoding
 
 
 def custom_login(request):
@@ -26,7 +46,10 @@ def custom_login(request):
                     return render(request, 'users/login.html')
 
                 # Check password
-                if participant.check_password(password):
+                with metrics.timer('password_hash_duration_seconds'):
+                    password_ok = participant.check_password(password)
+
+                if password_ok:
                     # Use Django's auth system but with our participant
                     from django.contrib.auth.models import User
 
@@ -48,6 +71,7 @@ def custom_login(request):
                     # Log in the Django user
                     from django.contrib.auth import login
                     login(request, user)
+                    start_participant_session(request, participant)
 
                     return redirect('users:dashboard')
                 else:
@@ -61,22 +85,30 @@ def custom_login(request):
 
 
 def custom_logout(request):
+    # Revokes copies of the session too (see big_brother.auth)
     logout(request)
     return redirect('users:login')
 
 
 def role_check(required_roles):
-    def test_func(user):
-        if user.is_authenticated:
-            # Check if user has a participant profile with required role
-            try:
-                participant = Participant.objects.get(username=user.username)
-                return participant.role in required_roles
-            except Participant.DoesNotExist:
-                return False
-        return False
-
-    return user_passes_test(test_func, login_url='users:login')
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.user.is_authenticated:
+                # The role is stored in the session at login; role changes revoke the session
+                role = request.session.get(ROLE_SESSION_KEY)
+                if role is None:
+                    # Check if user has a participant profile with required role
+                    role = Participant.objects.filter(username=request.user.username).values_list(
+                        'role', flat=True).first()
+                    request.session[ROLE_SESSION_KEY] = role
+                if role in required_roles:
+                    return view_func(request, *args, **kwargs)
+            return redirect_to_login(request.get_full_path(), resolve_url('users:login'))
+
+        return wrapper
+
+    return decorator
 
 
 @login_required(login_url='users:login')
@@ -90,99 +122,76 @@ def dashboard(request):
 
 
 def participant_list(request):
-    # Get all participants
-    participants = Participant.objects.all().order_by('-updated_at')
     # Get all users who can assign participants (for the assigned_by filter)
     assigners = Participant.objects.filter(role__in=['admin', 'moderator']).distinct()
 
-    # Get search parameters from request
-    search_query = request.GET.get('q', '')
-    assigned_by = request.GET.get('assigned_by', '')
-    first_name = request.GET.get('first_name', '')
-    last_name = request.GET.get('last_name', '')
-    nickname = request.GET.get('nickname', '')
-    phone = request.GET.get('phone', '')
-    email = request.GET.get('email', '')
-    status = request.GET.get('status', '')
-    activity = request.GET.get('activity', '')
-    activity_address = request.GET.get('activity_address', '')
-    job = request.GET.get('job', '')
-    job_address = request.GET.get('job_address', '')
-    address = request.GET.get('address', '')
-
-    # Build filter conditions
-    filters = Q()
-
-    # Quick search across multiple fields
-    if search_query:
-        filters &= (
-                Q(username__icontains=search_query) |
-                Q(nickname__icontains=search_query) |
-                Q(first_name__icontains=search_query) |
-                Q(last_name__icontains=search_query) |
-                Q(phones__number__icontains=search_query) |
-                Q(emails__email__icontains=search_query) |
-                Q(history__value__icontains=search_query) |
-                Q(history__record_type__icontains=search_query)
-        )
-
-    # Specific field filters
-    if assigned_by:
-        filters &= Q(assigned_by__id=assigned_by)
-
-    if first_name:
-        filters &= Q(first_name__icontains=first_name)
-
-    if last_name:
-        filters &= Q(last_name__icontains=last_name)
-
-    if nickname:
-        filters &= Q(nickname__icontains=nickname)
-
-    if phone:
-        filters &= Q(phones__number__icontains=phone)
-
-    if email:
-        filters &= Q(emails__email__icontains=email)
-
-    if status:
-        filters &= Q(status=status)
-
-    # Historical record filters
-    if activity:
-        filters &= Q(history__record_type='activity', history__value__icontains=activity)
-
-    if activity_address:
-        filters &= Q(history__record_type='activity_address', history__value__icontains=activity_address)
-
-    if job:
-        filters &= Q(history__record_type='job', history__value__icontains=job)
-
-    if job_address:
-        filters &= Q(history__record_type='job_address', history__value__icontains=job_address)
-
-    if address:
-        filters &= Q(history__record_type='address', history__value__icontains=address)
-
-    # Apply filters
-    if filters:
-        participants = participants.filter(filters).distinct()
-        is_filtered = True
-    else:
-        is_filtered = False
-
-    # Pagination
-    paginator = Paginator(participants, 25)  # Show 25 participants per page
+    filters = participant_filters(request.GET)
+    is_filtered = bool(filters)
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+
+    ids = search_result_ids(request.GET)
+    if ids is not None:
+        # Paginate the cached ids and fetch only this page's participants
+        paginator = Paginator(ids, 25)  # Show 25 participants per page
+        page_obj = paginator.get_page(page_number)
+        participants = Participant.objects.select_related('assigned_by').in_bulk(page_obj.object_list)
+        page_obj.object_list = [participants[pk] for pk in page_obj.object_list if pk in participants]
+    else:
+        # Too many matches to cache the ids
+        participants = Participant.objects.select_related('assigned_by').order_by('-updated_at')
+        if filters:
+            participants = participants.filter(filters).distinct()
+        paginator = Paginator(participants, 25)  # Show 25 participants per page
+        page_obj = paginator.get_page(page_number)
 
     return render(request, 'users/participant_list.html', {
         'participants': page_obj,
         'assigners': assigners,
-        'is_filtered': is_filtered
+        'facets': participant_facets(request.GET, assigners),
+        'is_filtered': is_filtered,
+        # Bulk actions apply to the current search, without the page number
+        'search_query': canonical_search(request.GET),
+        'can_bulk_edit': request.session.get(ROLE_SESSION_KEY) in ('admin', 'moderator'),
+        'bulk_actions': BulkActionForm.ACTIONS,
     })
 
 
+@login_required(login_url='users:login')
+@role_check(['admin', 'moderator'])
+@require_POST
+def participant_bulk_action(request):
+    form = BulkActionForm(request.POST)
+    list_url = f"{reverse('users:participant_list')}?{request.POST.get('query', '')}"
+
+    if not form.is_valid():
+        for error in form.non_field_errors():
+            messages.error(request, error)
+        if not form.non_field_errors():
+            messages.error(request, 'Please correct the bulk action fields.')
+        return redirect(list_url)
+
+    changes = form.changes()
+    ids = form.cleaned_data['ids'] if form.cleaned_data['scope'] == 'selected' else None
+    large = getattr(settings, 'BULK_ACTION_INLINE_LIMIT', 1000)
+
+    if ids is not None and len(ids) <= large:
+        count = bulk_update(target_participants(ids), changes, request.user.username)
+        messages.success(request, f'{count} participant(s) have been updated.')
+    else:
+        # Large selections run in chunks on a background worker
+        job = enqueue('bulk_update', {
+            'changes': changes,
+            'actor': request.user.username,
+            'ids': ids,
+            'query': form.cleaned_data['query'],
+        }, priority=5)
+        if job.status == Job.DONE:
+            messages.success(request, 'The bulk action has been applied.')
+        else:
+            messages.success(request, 'The bulk action has been queued and will be applied shortly.')
+
+    return redirect(list_url)
+
 
 @login_required(login_url='users:login')
 @role_check(['admin', 'moderator', 'viewer'])
@@ -289,16 +298,8 @@ def participant_edit(request, participant_id):
                 'address': request.POST.get('address'),
             }
 
-            for record_type, value in historical_fields.items():
-                if value:  # Only create record if value is provided and different from current
-                    # Check if this is different from the current value
-                    current_record = participant.history.filter(record_type=record_type).first()
-                    if not current_record or current_record.value != value:
-                        HistoricalRecord.objects.create(
-                            participant=participant,
-                            record_type=record_type,
-                            value=value
-                        )
+            # A handful of small queries; written now so the detail page shows them
+            record_history(participant.id, historical_fields)
 
             messages.success(request, f'Participant {participant.nickname} has been updated successfully!')
 
@@ -335,3 +336,57 @@ def participant_edit(request, participant_id):
     }
 
     return render(request, 'users/participant_form.html', context)
+
+
+def metrics_view(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorized = (
+        request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', [])
+        or (token and constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'))
+    )
+    if not authorized:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def immutable_media(request, path, document_root=None):
+    """Serve content-addressed media; the name changes whenever the content does"""
+    response = serve(request, path, document_root=document_root)
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+
+def serve_static(request, path):
+    """Serve collected static files, precompressed when the client accepts it"""
+    try:
+        full_path = safe_join(settings.STATIC_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    modified = os.stat(full_path).st_mtime
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), modified):
+        return HttpResponseNotModified()
+
+    # Pick the best precompressed variant written by collectstatic
+    accepted = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    encoding, serve_path = None, full_path
+    for token, suffix in ENCODINGS:
+        if accepts_encoding(accepted, token) and os.path.isfile(full_path + suffix):
+            encoding, serve_path = token, full_path + suffix
+            break
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    response = FileResponse(open(serve_path, 'rb'), content_type=content_type)
+    response['Last-Modified'] = http_date(modified)
+    response['Vary'] = 'Accept-Encoding'
+    if encoding:
+        response['Content-Encoding'] = encoding
+
+    # Hashed names change whenever the content does
+    if path in getattr(staticfiles_storage, 'versioned_names', ()):
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'no-cache'
+    return response